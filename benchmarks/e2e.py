@@ -0,0 +1,239 @@
+"""End-to-end benchmark of PytubeFunction against a local stand-in for YouTube, no network needed.
+
+Scenarios:
+    video       one large video, both streams and the mux
+    audio       the audio of one large video and its conversion
+    playlist    a playlist of small videos through the download pipeline
+    preview     metadata and thumbnails of the playlist, first cold and then from the cache
+
+Every scenario runs in a fresh interpreter, so the peak RSS is its own. The synthetic streams can't be decoded,
+so ffmpeg is replaced by a stand-in that concatenates its inputs: transcode times cover the process and file IO
+only. Results are written to a JSON file, pass --compare with an earlier one to see the difference.
+
+    python benchmarks/e2e.py --output e2e.json --compare e2e_before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SCENARIOS = ("video", "audio", "playlist", "preview")
+VIDEO_URL = "https://www.youtube.com/watch?v=L0000000001"
+
+FFMPEG_STAND_IN = """#!{python}
+import shutil, sys
+args = sys.argv[1:]
+inputs = [args[index + 1] for index, arg in enumerate(args) if arg == '-i']
+with open(args[-1], 'wb') as output:
+    for path in inputs:
+        with (sys.stdin.buffer if path == 'pipe:0' else open(path, 'rb')) as file:
+            shutil.copyfileobj(file, output, 1024 * 1024)
+"""
+
+
+class StageTimer:
+    """ Wall time and calls per stage, stages are methods of the object they are attached to """
+
+    def __init__(self):
+        self.stages = {}
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def attach(self, obj, *names) -> None:
+        for name in names:
+            setattr(obj, name, self.timed(name, getattr(obj, name)))
+
+    def timed(self, name: str, function: any) -> any:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                with self.lock:
+                    stage = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+                    stage["calls"] += 1
+                    stage["seconds"] += time.perf_counter() - start
+        return wrapper
+
+    def consume(self, size: int) -> None:
+        # Added to the downloader's limiters, so it sees every chunk, streamed into ffmpeg or not
+        with self.lock:
+            self.bytes += size
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(args: argparse.Namespace) -> dict:
+    import fake_pytube
+    from src.metadata_cache import MetadataCache
+    from src.pipeline import Pipeline
+    from src.pytube_function import PytubeFunction
+    from src.rate_limiter import MBIT, set_global_rate
+    from src.thumbnail_cache import ThumbnailCache
+
+    fake_pytube.install(args.server)
+    set_global_rate(args.limit * MBIT)
+
+    workdir = Path(args.workdir)
+    output_dir = workdir / "output"
+    output_dir.mkdir(exist_ok=True)
+    downloader = PytubeFunction(str(output_dir), metadata_cache=MetadataCache(workdir / "metadata.db"),
+                                segments=args.segments, streaming=args.streaming,
+                                scratch_dir=str(workdir / "scratch"))
+    downloader.thumbnail_cache = ThumbnailCache(workdir / "thumbnails", 200 * 1024 * 1024)
+
+    timer = StageTimer()
+    downloader.downloader.limiters.append(timer)
+    timer.attach(downloader, "resolve", "fetch", "download_stream", "transcode", "finalize", "fetch_playlist",
+                 "fetch_video", "download_thumbnail", "quick_search")
+
+    def ignore(*_) -> None:
+        pass
+
+    result = {}
+    playlist_url = f"https://www.youtube.com/playlist?list=PLbench{args.playlist_size}"
+    start = time.perf_counter()
+    if args.child == "video":
+        downloader.download_video(VIDEO_URL, ignore, None, ignore)
+    elif args.child == "audio":
+        done = []
+        downloader.download_audio(VIDEO_URL, ignore, None, lambda: done.append(True))
+        result["failed"] = 0 if done else 1
+    elif args.child == "playlist":
+        video_urls = downloader.fetch_playlist(playlist_url)["video_urls"]
+        if args.streaming:
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                list(executor.map(lambda url: downloader.download_video(url, ignore, None, ignore), video_urls))
+        else:
+            pipeline = Pipeline(args.workers, args.transcoders)
+            result["failed"] = pipeline.run(video_urls, lambda url: downloader.fetch(url, "video", ignore, None),
+                                            downloader.transcode, downloader.finalize)
+    elif args.child == "preview":
+        downloader.search_playlist(playlist_url, args.search_workers)
+        result["cold_seconds"] = time.perf_counter() - start
+        # Second run: everything comes from the metadata and thumbnail caches
+        cached_start = time.perf_counter()
+        downloader.search_playlist(playlist_url, args.search_workers)
+        result["cached_seconds"] = time.perf_counter() - cached_start
+    seconds = time.perf_counter() - start
+
+    result.update({"seconds": seconds, "bytes": timer.bytes, "peak_rss_mb": peak_rss_mb(), "stages": timer.stages,
+                   "files": len(os.listdir(output_dir))})
+    if timer.bytes:
+        result["mb_per_s"] = timer.bytes / (1024 * 1024) / seconds
+    return result
+
+
+def run_once(scenario: str, server_url: str, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory(prefix="ultrafetch-bench-") as workdir:
+        bin_dir = Path(workdir) / "bin"
+        bin_dir.mkdir()
+        ffmpeg = bin_dir / "ffmpeg"
+        ffmpeg.write_text(FFMPEG_STAND_IN.format(python=sys.executable), encoding="utf-8")
+        ffmpeg.chmod(0o755)
+
+        env = dict(os.environ, PATH=f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+        command = [sys.executable, __file__, "--child", scenario, "--server", server_url, "--workdir", workdir,
+                   "--playlist-size", str(args.playlist_size), "--workers", str(args.workers),
+                   "--transcoders", str(args.transcoders), "--segments", str(args.segments),
+                   "--search-workers", str(args.search_workers), "--limit", str(args.limit)]
+        if args.streaming:
+            command.append("--streaming")
+
+        output = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, timeout=1800)
+        for line in output.stdout.splitlines():
+            if line.startswith("E2E "):
+                return json.loads(line[len("E2E "):])
+        raise RuntimeError(f"Scenario {scenario} failed:\n{output.stderr}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)}, all by default")
+    parser.add_argument("--runs", type=int, default=3, help="runs per scenario, the median run is reported")
+    parser.add_argument("--output", default="e2e.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--large-mb", type=int, default=64, help="video stream size of the single video")
+    parser.add_argument("--small-mb", type=int, default=4, help="video stream size of the playlist videos")
+    parser.add_argument("--latency", type=int, default=20, help="milliseconds added to every page request")
+    parser.add_argument("--playlist-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4, help="playlist videos downloaded at the same time")
+    parser.add_argument("--transcoders", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--search-workers", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=0, help="bandwidth limit in Mbit/s, 0 means unlimited")
+    parser.add_argument("--streaming", action="store_true")
+    # Used by the scenario processes
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--server", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child:
+        print("E2E " + json.dumps(run_scenario(args)))
+        return
+
+    from media_server import MediaServer
+
+    server = MediaServer(args.large_mb, args.small_mb, args.latency / 1000).start()
+    results = {}
+    for scenario in args.scenarios:
+        runs = sorted((run_once(scenario, server.url, args) for _ in range(args.runs)), key=lambda run: run["seconds"])
+        results[scenario] = {**runs[len(runs) // 2], "runs": [run["seconds"] for run in runs],
+                             "stdev": statistics.pstdev(run["seconds"] for run in runs)}
+    server.shutdown()
+
+    settings = {key: value for key, value in vars(args).items()
+                if key not in ("scenarios", "output", "compare", "child", "server", "workdir")}
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"settings": settings, "scenarios": results}, file, indent=4)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)["scenarios"]
+
+    for scenario, result in results.items():
+        line = f"{scenario:>10}: {result['seconds']:8.2f} s"
+        if "mb_per_s" in result:
+            line += f"  {result['mb_per_s']:8.1f} MB/s"
+        if "cached_seconds" in result:
+            line += f"  cold {result['cold_seconds']:.2f} s, cached {result['cached_seconds']:.2f} s"
+        if result["peak_rss_mb"] is not None:
+            line += f"  {result['peak_rss_mb']:7.1f} MB peak"
+        if scenario in previous:
+            line += f"  ({result['seconds'] - previous[scenario]['seconds']:+.2f} s)"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Stand-ins for pytube's YouTube and Playlist that read the fixtures of a local MediaServer.
+
+Like pytube they fetch a page per object, so metadata lookups cost a real round trip.
+"""
+from datetime import date, datetime
+
+from pytube import extract
+
+from src.http_session import get_session
+
+server_url = None
+
+
+def install(url: str) -> None:
+    """ Points src.pytube_function at the server behind url """
+    global server_url
+    import src.pytube_function as pytube_function
+
+    server_url = url
+    pytube_function.YouTube = YouTube
+    pytube_function.Playlist = Playlist
+
+
+def get_json(path: str, **params) -> dict:
+    response = get_session().get(f"{server_url}{path}", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+class Stream:
+    def __init__(self, video_id: str, data: dict):
+        self.itag = data["itag"]
+        self.subtype = data["subtype"]
+        self.resolution = data["resolution"]
+        self.abr = data["abr"]
+        self.filesize = data["filesize"]
+        self.is_adaptive = True
+        self.includes_audio_track = data["only_audio"]
+        self.includes_video_track = not data["only_audio"]
+        self.url = f"{server_url}/stream/{video_id}/{self.itag}"
+
+
+class StreamQuery:
+    def __init__(self, streams: list):
+        self.streams = streams
+
+    def __iter__(self):
+        return iter(self.streams)
+
+    def filter(self, only_audio: bool = None, progressive: bool = None, adaptive: bool = None,
+               subtype: str = None) -> "StreamQuery":
+        streams = self.streams
+        if subtype:
+            streams = [stream for stream in streams if stream.subtype == subtype]
+        if only_audio:
+            streams = [stream for stream in streams if not stream.includes_video_track]
+        if progressive is False or adaptive:
+            streams = [stream for stream in streams if stream.is_adaptive]
+        return StreamQuery(streams)
+
+    def order_by(self, attribute: str) -> "StreamQuery":
+        streams = [stream for stream in self.streams if getattr(stream, attribute)]
+        return StreamQuery(sorted(streams, key=lambda stream: int(getattr(stream, attribute).rstrip("pkbs"))))
+
+    def desc(self) -> "StreamQuery":
+        return StreamQuery(self.streams[::-1])
+
+    def first(self) -> Stream | None:
+        return self.streams[0] if self.streams else None
+
+
+class YouTube:
+    def __init__(self, url: str, *args, **kwargs):
+        self.video_id = extract.video_id(url)
+        page = get_json("/watch", v=self.video_id)
+
+        self.title = page["title"]
+        self.author = page["author"]
+        self.channel_url = page["channel_url"]
+        self.thumbnail_url = page["thumbnail_url"]
+        self.views = page["views"]
+        self.publish_date = datetime.fromisoformat(page["publish_date"])
+        self.streams = StreamQuery([Stream(self.video_id, stream) for stream in page["streams"]])
+
+
+class Playlist:
+    def __init__(self, url: str, *args, **kwargs):
+        page = get_json("/playlist", list=extract.playlist_id(url))
+
+        self.title = page["title"]
+        self.owner = page["owner"]
+        self.views = page["views"]
+        self.last_updated = date.fromisoformat(page["last_updated"])
+        self.video_urls = [f"https://www.youtube.com/watch?v={video_id}" for video_id in page["video_ids"]]
+        self.length = len(self.video_urls)
@@ -0,0 +1,113 @@
+"""Local stand-in for YouTube: watch page and playlist fixtures as JSON, synthetic streams and thumbnails.
+
+Video ids starting with "L" get large streams, all others small ones. A playlist id ends in the number of videos
+it holds, e.g. PLbench100. Streams support range requests like googlevideo does.
+"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MB = 1024 * 1024
+AUDIO_ITAG = 140
+VIDEO_ITAG = 137
+BLOCK = os.urandom(MB)  # streams repeat this block, so any size is served without holding it in memory
+
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, large_mb: int = 64, small_mb: int = 4, latency: float = 0.02):
+        super().__init__(('127.0.0.1', 0), MediaHandler)
+        self.large_mb = large_mb
+        self.small_mb = small_mb
+        self.latency = latency
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self) -> "MediaServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stream_size(self, video_id: str, itag: int) -> int:
+        size = (self.large_mb if video_id.startswith("L") else self.small_mb) * MB
+        # Audio is about an eighth of the video
+        return size // 8 + 123 if itag == AUDIO_ITAG else size + 456
+
+    def watch_page(self, video_id: str) -> dict:
+        return {
+            "video_id": video_id, "title": f"Benchmark video {video_id}", "author": "UltraFetch benchmark",
+            "channel_url": f"{self.url}/channel/bench", "thumbnail_url": f"{self.url}/thumb/{video_id}/hqdefault.jpg",
+            "views": 123456, "publish_date": "2024-01-01T00:00:00",
+            "streams": [
+                {"itag": VIDEO_ITAG, "subtype": "mp4", "resolution": "1080p", "abr": None, "only_audio": False,
+                 "filesize": self.stream_size(video_id, VIDEO_ITAG)},
+                {"itag": AUDIO_ITAG, "subtype": "mp4", "resolution": None, "abr": "128kbps", "only_audio": True,
+                 "filesize": self.stream_size(video_id, AUDIO_ITAG)},
+            ],
+        }
+
+    def playlist_page(self, playlist_id: str) -> dict:
+        count = int(re.search(r"(\d+)$", playlist_id)[1])
+        return {"title": f"Benchmark playlist {playlist_id}", "owner": "UltraFetch benchmark", "views": 4321,
+                "last_updated": (datetime(2024, 1, 1) + timedelta(days=count)).date().isoformat(),
+                "video_ids": [f"S{index:010d}" for index in range(count)]}
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    server: MediaServer
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real servers
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/watch":
+            self.send_json(self.server.watch_page(query["v"][0]))
+        elif url.path == "/playlist":
+            self.send_json(self.server.playlist_page(query["list"][0]))
+        elif match := re.fullmatch(r"/stream/([\w-]+)/(\d+)", url.path):
+            self.send_stream(self.server.stream_size(match[1], int(match[2])))
+        elif url.path.startswith("/thumb/"):
+            self.send_body(BLOCK[:32 * 1024], "image/jpeg")
+        else:
+            self.send_error(404)
+
+    def send_json(self, data: dict) -> None:
+        # Pages are generated server side on the real site, the latency stands for that and the round trip
+        time.sleep(self.server.latency)
+        self.send_body(json.dumps(data).encode(), "application/json")
+
+    def send_body(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, size: int) -> None:
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        start, end = (int(match[1]), int(match[2] or size - 1)) if match else (0, size - 1)
+        end = min(end, size - 1)
+
+        self.send_response(206 if match else 200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(end - start + 1))
+        if match:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        position = start
+        while position <= end:
+            offset = position % len(BLOCK)
+            chunk = BLOCK[offset:offset + min(256 * 1024, end - position + 1)]
+            self.wfile.write(chunk)
+            position += len(chunk)
@@ -0,0 +1,87 @@
+"""Startup time of the GUI: import time of main.py and time until the window first paints.
+
+Every run starts a fresh interpreter under QT_QPA_PLATFORM=offscreen, the medians are written to a JSON file.
+Pass --compare with an earlier result file to see the difference.
+
+    python benchmarks/startup.py --runs 10 --output startup.json --compare startup_before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+
+class PaintWatcher(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and "first_paint" not in result:
+            result["first_paint"] = time.perf_counter() - start
+            QTimer.singleShot(0, app.quit)
+        return False
+
+result = {"import": imported - start}
+app = QApplication(sys.argv)
+watcher = PaintWatcher()
+app.installEventFilter(watcher)
+window = main.Window()
+result["window_created"] = time.perf_counter() - start
+window.show()
+QTimer.singleShot(10000, app.quit)
+app.exec_()
+result["modules"] = len(sys.modules)
+print("STARTUP " + json.dumps(result))
+"""
+
+
+def run_once() -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=60)
+    for line in output.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            return json.loads(line[len("STARTUP "):])
+    raise RuntimeError(f"Startup probe failed:\n{output.stderr}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="startup.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    result = {key: statistics.median(run[key] for run in runs if key in run)
+              for key in ("import", "window_created", "first_paint", "modules")}
+    result["runs"] = args.runs
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=4)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)
+
+    for key in ("import", "window_created", "first_paint"):
+        line = f"{key:>15}: {result[key] * 1000:8.1f} ms"
+        if previous and key in previous:
+            line += f"  ({(result[key] - previous[key]) * 1000:+.1f} ms)"
+        print(line)
+    print(f"{'modules':>15}: {result['modules']:8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Headless batch downloader.
+
+Reads video and playlist URLs from arguments, a file or stdin and prints one JSON object per line for every
+progress update, finished or failed item. Never imports Qt, so it runs on servers without a display.
+
+    python cli.py --mode audio --workers 4 < urls.txt
+
+With --sync, playlists only download the videos that aren't in the output folder yet, a manifest per playlist
+there records what was downloaded:
+
+    python cli.py --sync -o ~/Mirror "https://www.youtube.com/playlist?list=..."
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+from src.http_session import configure_session
+from src.metrics import configure_metrics
+from src.pipeline import Pipeline
+from src.progress import ProgressTracker, stream_parts
+from src.pytube_function import PytubeFunction
+from src.rate_limiter import MBIT, set_global_rate
+from src.sync import sync_playlist
+
+
+class JsonReporter:
+    """ Writes one JSON event per line, progress is limited to one event per second and item """
+
+    PROGRESS_INTERVAL = 1.0
+
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.trackers = {}
+
+    def emit(self, event: str, url: str, **fields) -> None:
+        line = json.dumps({"event": event, "url": url, "time": round(time.time(), 3), **fields})
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def progress(self, url: str, stream, _, bytes_remaining: int) -> None:
+        with self.lock:
+            tracker = self.trackers.setdefault(url, ProgressTracker(self.PROGRESS_INTERVAL))
+        for key, filesize, remaining in stream_parts(stream, bytes_remaining):
+            tracker.update(key, filesize, remaining)
+        if not tracker.due(force=bytes_remaining == 0):
+            return
+
+        total_size = stream.filesize
+        percent = round((total_size - bytes_remaining) / total_size * 100, 1) if total_size else 100.0
+        self.emit("progress", url, percent=percent, bytes_remaining=bytes_remaining, total_bytes=total_size,
+                  speed=round(tracker.speed()), eta=tracker.eta())
+
+
+def read_urls(args: argparse.Namespace) -> list:
+    lines = list(args.urls)
+    if args.input:
+        with (sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')) as file:
+            lines.extend(file)
+    elif not lines:
+        lines.extend(sys.stdin)
+
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith('#')]
+
+
+def is_playlist(url: str) -> bool:
+    return "list=" in url and "watch?" not in url
+
+
+def expand_urls(downloader: PytubeFunction, urls: list, reporter: JsonReporter) -> list:
+    videos = []
+    for url in urls:
+        if is_playlist(url):
+            try:
+                playlist = downloader.fetch_playlist(url)
+            except Exception as e:
+                reporter.emit("error", url, error=str(e))
+                continue
+            reporter.emit("playlist", url, title=playlist["title"], videos=len(playlist["video_urls"]))
+            videos.extend(playlist["video_urls"])
+        else:
+            videos.append(url)
+
+    # The same video twice would share one scratch workspace
+    return list(dict.fromkeys(videos))
+
+
+def download(downloader: PytubeFunction, url: str, mode: str, reporter: JsonReporter) -> bool:
+    done = []
+    download_function = downloader.download_audio if mode == "audio" else downloader.download_video
+    try:
+        download_function(url, lambda *progress: reporter.progress(url, *progress), None, lambda: done.append(True))
+    except Exception as e:
+        reporter.emit("error", url, error=str(e))
+        return False
+
+    # download_audio reports its errors itself and just never calls back
+    if not done:
+        reporter.emit("error", url, error="Download failed")
+        return False
+    reporter.emit("done", url)
+    return True
+
+
+def sync(downloader: PytubeFunction, url: str, args: argparse.Namespace, reporter: JsonReporter) -> tuple:
+    """ Downloads the new videos of a playlist, returns (videos, failed) """
+    totals = []
+
+    def on_pending(pending: int, total: int) -> None:
+        totals.append(total)
+        reporter.emit("playlist", url, videos=total, new=pending)
+
+    try:
+        skipped, failed = sync_playlist(
+            downloader, url, args.mode, args.workers, args.transcoders,
+            progress_callback=lambda item: partial(reporter.progress, item[1]), pending_callback=on_pending,
+            done_callback=lambda item: reporter.emit("done", item[1]),
+            error_callback=lambda item, e: reporter.emit("error", item[1], error=str(e)), verify=args.verify)
+    except Exception as e:
+        reporter.emit("error", url, error=str(e))
+        # The playlist itself counts as the failed item, its videos are unknown
+        return 1, 1
+
+    reporter.emit("synced", url, skipped=skipped, failed=failed)
+    return totals[0], failed
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download YouTube videos and playlists without the GUI.")
+    parser.add_argument("urls", nargs="*", help="video or playlist URLs, read from stdin when none are given")
+    parser.add_argument("-i", "--input", help="file with one URL per line, '-' for stdin")
+    parser.add_argument("-m", "--mode", choices=("video", "audio"), default="video")
+    parser.add_argument("-f", "--format", choices=("mp3", "m4a", "opus", "webm"), default="mp3",
+                        help="audio format, only mp3 is encoded, the others copy the audio stream")
+    parser.add_argument("-o", "--output", default=str(Path.home() / "Downloads"), help="download folder")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="videos downloaded at the same time")
+    parser.add_argument("-s", "--segments", type=int, default=4, help="connections per file")
+    parser.add_argument("-t", "--transcoders", type=int, default=os.cpu_count() or 1,
+                        help="ffmpeg processes running at the same time")
+    parser.add_argument("--streaming", action="store_true", help="pipe downloads straight into ffmpeg")
+    parser.add_argument("--scratch", help="folder for temporary files, e.g. /dev/shm/ultrafetch")
+    parser.add_argument("--pool-size", type=int, default=32, help="HTTP connections kept alive per host")
+    parser.add_argument("--timeout", type=int, default=15, help="HTTP timeout in seconds")
+    parser.add_argument("--metrics", help="folder for stage metrics as JSON lines and a Prometheus file")
+    parser.add_argument("--limit", type=int, default=0, help="bandwidth limit in Mbit/s, 0 means unlimited")
+    parser.add_argument("--sync", action="store_true", help="only download playlist videos that are new or changed")
+    parser.add_argument("--verify", action="store_true", help="with --sync, compare the hashes of existing files")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    args = parse_args(argv)
+    reporter = JsonReporter()
+
+    configure_session(args.pool_size, args.timeout)
+    set_global_rate(args.limit * MBIT)
+    metrics = configure_metrics(args.metrics)
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    downloader = PytubeFunction(args.output, segments=args.segments, streaming=args.streaming,
+                                scratch_dir=args.scratch, audio_format=args.format)
+
+    urls = read_urls(args)
+    total = failed = 0
+    if args.sync:
+        playlists = [url for url in urls if is_playlist(url)]
+        urls = [url for url in urls if not is_playlist(url)]
+        for url in playlists:
+            videos, sync_failed = sync(downloader, url, args, reporter)
+            total += videos
+            failed += sync_failed
+
+    urls = expand_urls(downloader, urls, reporter)
+    if args.streaming:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            futures = [executor.submit(download, downloader, url, args.mode, reporter) for url in urls]
+            for future in as_completed(futures):
+                if not future.result():
+                    failed += 1
+    elif urls:
+        # Downloads go on while ffmpeg converts the ones that are already there
+        pipeline = Pipeline(args.workers, args.transcoders)
+        failed += pipeline.run(
+            urls, lambda url: downloader.fetch(url, args.mode, partial(reporter.progress, url), None),
+            downloader.transcode, downloader.finalize, lambda url: reporter.emit("done", url),
+            lambda url, e: reporter.emit("error", url, error=str(e)))
+
+    metrics.flush()
+    reporter.emit("summary", None, total=total + len(urls), failed=failed)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
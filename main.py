@@ -1,4 +1,3 @@
-import glob
 import os
 import sys
 from pathlib import Path
@@ -6,10 +5,13 @@ from pathlib import Path
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QApplication
 from qfluentwidgets import FluentIcon as FIF, MSFluentWindow
-from qfluentwidgets import NavigationItemPosition
+from qfluentwidgets import NavigationItemPosition, InfoBar, InfoBarPosition
 
 from src.config import cfg
-from src.interfaces import HomeInterface, PlaylistInterface, SettingInterface, DownloadInterface
+from src.functions import clean_download_dir
+from src.download_queue import download_queue
+from src.interfaces import HomeInterface, PlaylistInterface, SettingInterface, DownloadInterface, QueueInterface
+from src.widgets import LazyInterface
 
 APP_LOGO = str(Path(__file__).parent / "src" / "assets" / "icons" / "logo.png")
 
@@ -19,25 +21,44 @@ class Window(MSFluentWindow):
         super().__init__()
         self._init_window()
 
-        self.download_dir = Path(__file__).parent / "src" / "assets" / "downloads"
+        self.download_dir = Path(cfg.get(cfg.scratchFolder))
         if not os.path.exists(self.download_dir):
             os.makedirs(self.download_dir)
 
+        # Only the home page is visible at startup, the others are built when first opened
         self.home_interface = HomeInterface(self)
-        self.video_interface = DownloadInterface(self, 'video')
-        self.audio_interface = DownloadInterface(self, 'audio')
-        self.playlist_interface = PlaylistInterface(self)
-        self.settings_interface = SettingInterface(self)
-
-        self.settings_interface.mica_enable_changed.connect(self.setMicaEffectEnabled)
+        self.video_interface = LazyInterface(self, 'video', lambda: DownloadInterface(self, 'video'))
+        self.audio_interface = LazyInterface(self, 'audio', lambda: DownloadInterface(self, 'audio'))
+        self.playlist_interface = LazyInterface(self, 'playlist_interface', lambda: PlaylistInterface(self))
+        self.queue_interface = LazyInterface(self, 'queue_interface', lambda: QueueInterface(self))
+        self.settings_interface = LazyInterface(self, 'settings_interface', self._create_settings_interface)
 
         self.init_navigation()
 
+        # Pick up jobs left pending by the previous session
+        download_queue().job_finished.connect(self.on_job_finished)
+        download_queue().schedule()
+
+    def on_job_finished(self, job_id: str, success: bool) -> None:
+        job = download_queue().get(job_id)
+        if success:
+            InfoBar.success("Success", f"{job.title} downloaded successfully.", duration=10000, parent=self,
+                            position=InfoBarPosition.BOTTOM_RIGHT)
+        else:
+            InfoBar.error("Error", f"{job.title} failed, retry it from the queue.", duration=10000, parent=self,
+                          position=InfoBarPosition.BOTTOM_RIGHT)
+
+    def _create_settings_interface(self) -> SettingInterface:
+        settings_interface = SettingInterface(self)
+        settings_interface.mica_enable_changed.connect(self.setMicaEffectEnabled)
+        return settings_interface
+
     def init_navigation(self):
         self.addSubInterface(self.home_interface, FIF.HOME, 'Home')
         self.addSubInterface(self.video_interface, FIF.VIDEO, 'Video')
         self.addSubInterface(self.audio_interface, FIF.MUSIC, 'MP3')
         self.addSubInterface(self.playlist_interface, FIF.MEDIA, 'Playlist')
+        self.addSubInterface(self.queue_interface, FIF.DOWNLOAD, 'Queue')
 
         self.addSubInterface(self.settings_interface, FIF.SETTING, 'Settings', position=NavigationItemPosition.BOTTOM)
 
@@ -54,9 +75,10 @@ class Window(MSFluentWindow):
         self.move(width // 2 - self.width() // 2, height // 2 - self.height() // 2)
 
     def closeEvent(self, event):
-        files_to_remove = glob.glob(f'{self.download_dir}/*')
-        for file in files_to_remove:
-            os.remove(file)
+        # Running jobs stop and stay queued, cleanup keeps their partial downloads
+        self.hide()
+        download_queue().shutdown()
+        clean_download_dir(cfg.get(cfg.scratchFolder))
 
         event.accept()
 
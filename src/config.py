@@ -1,11 +1,13 @@
 from pathlib import Path
 
-from qfluentwidgets import (qconfig, QConfig, ConfigItem, FolderValidator,
-                            BoolValidator, Theme)
+from qfluentwidgets import (qconfig, QConfig, ConfigItem, FolderValidator, BoolValidator, OptionsConfigItem,
+                            OptionsValidator, RangeConfigItem, RangeValidator, Theme)
 
 from src.functions import isWin11
+from src.workspace import SCRATCH_PATH
 
 downloads_path = Path.home() / 'Downloads'
+metrics_path = Path(__file__).parent / "assets" / "metrics"
 
 
 class Config(QConfig):
@@ -14,6 +16,39 @@ class Config(QConfig):
     # download folders
     downloadFolder = ConfigItem(
         "Folders", "Download", str(downloads_path), FolderValidator())
+    scratchFolder = ConfigItem(
+        "Folders", "Scratch", str(SCRATCH_PATH), FolderValidator())
+
+    # downloads
+    maxWorkers = RangeConfigItem("Download", "MaxWorkers", 4, RangeValidator(1, 8))
+    searchWorkers = RangeConfigItem("Download", "SearchWorkers", 8, RangeValidator(1, 32))
+    segments = RangeConfigItem("Download", "Segments", 4, RangeValidator(1, 16))
+    streamingEnabled = ConfigItem("Download", "StreamingEnabled", False, BoolValidator())
+    # Last output format picked in the MP3 tab
+    audioFormat = OptionsConfigItem("Download", "AudioFormat", "mp3", OptionsValidator(["mp3", "m4a", "opus", "webm"]))
+
+    # queue
+    maxActiveJobs = RangeConfigItem("Queue", "MaxActive", 3, RangeValidator(1, 16))
+    maxVideoJobs = RangeConfigItem("Queue", "MaxVideo", 2, RangeValidator(1, 16))
+    maxAudioJobs = RangeConfigItem("Queue", "MaxAudio", 2, RangeValidator(1, 16))
+    maxPlaylistJobs = RangeConfigItem("Queue", "MaxPlaylist", 1, RangeValidator(1, 4))
+
+    # network
+    poolSize = RangeConfigItem("Network", "PoolSize", 32, RangeValidator(4, 128))
+    timeout = RangeConfigItem("Network", "Timeout", 15, RangeValidator(5, 120))
+    # Mbit/s, 0 means unlimited
+    maxBandwidth = RangeConfigItem("Network", "MaxBandwidth", 0, RangeValidator(0, 1000))
+    jobBandwidth = RangeConfigItem("Network", "JobBandwidth", 0, RangeValidator(0, 1000))
+
+    # cache
+    thumbnailCacheSize = RangeConfigItem("Cache", "ThumbnailCacheSize", 200, RangeValidator(10, 2000))
+    metadataTTL = RangeConfigItem("Cache", "MetadataTTL", 168, RangeValidator(1, 720))
+    viewsTTL = RangeConfigItem("Cache", "ViewsTTL", 60, RangeValidator(1, 1440))
+
+    # diagnostics
+    metricsEnabled = ConfigItem("Diagnostics", "Metrics", False, BoolValidator())
+    metricsFolder = ConfigItem("Diagnostics", "MetricsFolder", str(metrics_path), FolderValidator())
+    profilingEnabled = ConfigItem("Diagnostics", "Profiling", False, BoolValidator())
 
     # main window
     micaEnabled = ConfigItem("MainWindow", "MicaEnabled", isWin11(), BoolValidator())
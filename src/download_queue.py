@@ -0,0 +1,248 @@
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from src.config import cfg
+from src.threads import DownloadThread
+
+QUEUE_PATH = Path(__file__).parent / "config" / "queue.json"
+
+PRIORITIES = {"Low": -1, "Normal": 0, "High": 1}
+
+
+class DownloadJob:
+    def __init__(self, url: str | list, kind: str, title: str = "", priority: int = 0, job_id: str = None,
+                 status: str = "pending", audio_format: str = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.url = url
+        self.kind = kind
+        self.audio_format = audio_format
+        self.title = title or (url if isinstance(url, str) else f"{len(url)} videos")
+        self.priority = priority
+        self.status = status
+        self.progress = 0
+        self.detail = ""
+        # Playlist videos that are downloading right now, by playlist index
+        self.items = {}
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "url": self.url, "kind": self.kind, "title": self.title, "priority": self.priority,
+                "status": self.status, "audio_format": self.audio_format}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DownloadJob":
+        # Jobs that were running when the app closed start over (and resume their .part files)
+        status = "pending" if data["status"] == "running" else data["status"]
+        return cls(data["url"], data["kind"], data["title"], data["priority"], data["id"], status,
+                   data.get("audio_format"))
+
+
+class DownloadQueue(QObject):
+    """ Runs download jobs by priority within global and per type limits, pending jobs are kept on disk """
+
+    job_added = pyqtSignal(str)
+    job_changed = pyqtSignal(str)
+    job_removed = pyqtSignal(str)
+    job_finished = pyqtSignal(str, bool)
+    order_changed = pyqtSignal()
+
+    def __init__(self, path: str | Path = QUEUE_PATH, parent=None):
+        super().__init__(parent=parent)
+        self.path = Path(path)
+        self.jobs = []
+        self.threads = {}
+        self.stopping = False
+
+        self.load()
+
+    def limit(self, kind: str) -> int:
+        return {"video": cfg.get(cfg.maxVideoJobs), "audio": cfg.get(cfg.maxAudioJobs),
+                "playlist": cfg.get(cfg.maxPlaylistJobs), "sync": cfg.get(cfg.maxPlaylistJobs)}.get(kind, 1)
+
+    def get(self, job_id: str) -> DownloadJob | None:
+        return next((job for job in self.jobs if job.id == job_id), None)
+
+    def ordered(self) -> list:
+        """ Pending jobs in the order they will start: priority first, then queue position """
+        pending = [(index, job) for index, job in enumerate(self.jobs) if job.status == "pending"]
+        return [job for _, job in sorted(pending, key=lambda item: (-item[1].priority, item[0]))]
+
+    def add(self, url: str | list, kind: str, title: str = "", priority: int = 0,
+            audio_format: str = None) -> DownloadJob:
+        job = DownloadJob(url, kind, title, priority, audio_format=audio_format)
+        self.jobs.append(job)
+        self.save()
+        self.job_added.emit(job.id)
+        self.schedule()
+        return job
+
+    def remove(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None or job.status == "running":
+            return
+
+        self.jobs.remove(job)
+        self.save()
+        self.job_removed.emit(job_id)
+
+    def retry(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job and job.status == "failed":
+            job.status = "pending"
+            job.progress = 0
+            job.detail = ""
+            self.save()
+            self.job_changed.emit(job_id)
+            self.schedule()
+
+    def set_priority(self, job_id: str, priority: int) -> None:
+        job = self.get(job_id)
+        if job and job.priority != priority:
+            job.priority = priority
+            self.save()
+            self.order_changed.emit()
+
+    def move(self, job_id: str, offset: int) -> None:
+        """ Swaps a pending job with its neighbour in the start order, e.g. offset -1 moves it up """
+        job = self.get(job_id)
+        if job is None or job.status != "pending":
+            return
+
+        # Only pending jobs of the same priority can change places, others start by their priority anyway
+        peers = [peer for peer in self.ordered() if peer.priority == job.priority]
+        position = peers.index(job) + offset
+        if 0 <= position < len(peers):
+            index, new_index = self.jobs.index(job), self.jobs.index(peers[position])
+            self.jobs[index], self.jobs[new_index] = self.jobs[new_index], self.jobs[index]
+            self.save()
+            self.order_changed.emit()
+
+    def schedule(self) -> None:
+        if self.stopping:
+            return
+
+        running = [job for job in self.jobs if job.status == "running"]
+        for job in self.ordered():
+            if len(running) >= cfg.get(cfg.maxActiveJobs):
+                break
+            if sum(1 for active in running if active.kind == job.kind) >= self.limit(job.kind):
+                continue
+
+            self.start(job)
+            running.append(job)
+
+    def start(self, job: DownloadJob) -> None:
+        job.status = "running"
+        job.detail = ""
+        job.items = {}
+        self.job_changed.emit(job.id)
+
+        thread = DownloadThread(job.url, job.kind, job.audio_format)
+        thread.progress_signal.connect(lambda value: self.on_progress(job.id, value))
+        thread.timeleft_signal.connect(lambda text: self.on_detail(job.id, text))
+        thread.complete_signal.connect(
+            lambda value: self.on_detail(job.id, f"{value} of {thread.item_count} videos completed"))
+        thread.item_progress_signal.connect(lambda index, value: self.on_item_progress(job.id, index, value))
+        thread.all_done_signal.connect(lambda value: self.on_done(job.id, value))
+        thread.finished.connect(lambda: self.on_finished(job.id))
+        self.threads[job.id] = thread
+        thread.start()
+
+    def on_progress(self, job_id: str, value: int) -> None:
+        job = self.get(job_id)
+        if job:
+            job.progress = value
+            self.job_changed.emit(job_id)
+
+    def on_detail(self, job_id: str, text: str) -> None:
+        job = self.get(job_id)
+        if job:
+            job.detail = text
+            self.job_changed.emit(job_id)
+
+    def on_item_progress(self, job_id: str, index: int, value: int) -> None:
+        job = self.get(job_id)
+        if job:
+            # Finished and failed (-1) videos are covered by the completed count
+            if 0 <= value < 100:
+                job.items[index] = value
+            else:
+                job.items.pop(index, None)
+            self.job_changed.emit(job_id)
+
+    def on_done(self, job_id: str, value: bool) -> None:
+        job = self.get(job_id)
+        if job and not self.stopping:
+            job.status = "done" if value else "failed"
+
+    def on_finished(self, job_id: str) -> None:
+        self.threads.pop(job_id, None)
+        if self.stopping:
+            return
+
+        job = self.get(job_id)
+        if job:
+            # A thread that ends without reporting success has failed
+            if job.status == "running":
+                job.status = "failed"
+            job.progress = 100 if job.status == "done" else job.progress
+            job.detail = ""
+            job.items = {}
+            self.save()
+            self.job_changed.emit(job_id)
+            self.job_finished.emit(job_id, job.status == "done")
+
+        self.schedule()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """ Stops all running jobs, they are saved as pending and resume their partial files on the next start """
+        self.stopping = True
+        for job in self.jobs:
+            if job.status == "running":
+                job.status = "pending"
+        self.save()
+
+        for thread in self.threads.values():
+            thread.cancel()
+        deadline = time.monotonic() + timeout
+        for thread in list(self.threads.values()):
+            if not thread.wait(max(0, int((deadline - time.monotonic()) * 1000))):
+                # Stuck in a blocking call, its job is already saved and a QThread must not outlive the app
+                thread.terminate()
+                thread.wait()
+
+    def clear_finished(self) -> None:
+        for job in [job for job in self.jobs if job.status == "done"]:
+            self.jobs.remove(job)
+            self.job_removed.emit(job.id)
+        self.save()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                self.jobs = [DownloadJob.from_dict(data) for data in json.load(file)]
+        except (OSError, ValueError, KeyError):
+            self.jobs = []
+
+    def save(self) -> None:
+        # Finished jobs are only kept for this session
+        data = [job.to_dict() for job in self.jobs if job.status != "done"]
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=4)
+        os.replace(temp_path, self.path)
+
+
+_download_queue = None
+
+
+def download_queue() -> DownloadQueue:
+    global _download_queue
+
+    if _download_queue is None:
+        _download_queue = DownloadQueue()
+    return _download_queue
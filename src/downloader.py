@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from src.http_session import get_session
+
+PART_SUFFIX = ".part"
+JOURNAL_SUFFIX = ".part.json"
+
+
+class DownloadCancelled(Exception):
+    """ Raised in the transfers of a job that was stopped, its partial files stay for a resume """
+
+    def __init__(self, message: str = "Download stopped"):
+        super().__init__(message)
+
+
+def check_range(response: requests.Response, offset: int, end: int, filesize: int) -> None:
+    """ Raises unless the response starts at the requested offset """
+    if response.status_code == 206:
+        content_range = response.headers.get("Content-Range")
+        if content_range and not content_range.startswith(f"bytes {offset}-"):
+            raise IOError(f"Server sent {content_range} for bytes {offset}-{end}")
+    elif offset > 0 or end < filesize - 1:
+        # A plain 200 is the whole file, only usable when the whole file was asked for
+        raise IOError("Server does not support range requests")
+
+
+class SegmentedDownloader:
+    """ Downloads a stream over several parallel connections, each piece is written at its own offset """
+
+    PIECE_SIZE = 8 * 1024 * 1024  # googlevideo throttles long single requests, so ranges stay small
+    CHUNK_SIZE = 256 * 1024
+    TIMEOUT = 30
+
+    def __init__(self, segments: int = 4, session: requests.Session = None, limiters: list = None):
+        self.segments = max(1, segments)
+        self.session = session or get_session()
+        self.limiters = limiters or []  # TokenBuckets, every chunk waits for all of them
+        self.cancelled = threading.Event()
+
+    def download(self, stream, output_path: str, progress_callback: any = None) -> str:
+        filesize = stream.filesize
+        # Finished by an earlier run of the job, e.g. the video stream when only the audio was cut off
+        if os.path.isfile(output_path) and os.path.getsize(output_path) == filesize:
+            if progress_callback:
+                progress_callback(stream, b'', 0)
+            return output_path
+
+        part_path = output_path + PART_SUFFIX
+        journal = Journal.load(output_path + JOURNAL_SUFFIX, stream.itag, filesize, self.PIECE_SIZE)
+
+        # Start over unless the journal matches a partial file of the same stream
+        if not journal.done or not os.path.isfile(part_path) or os.path.getsize(part_path) != filesize:
+            journal.done.clear()
+            # Preallocate so every piece can be written in place
+            with open(part_path, 'wb') as file:
+                file.truncate(filesize)
+            journal.save(force=True)
+
+        pieces = [(start, min(start + self.PIECE_SIZE, filesize) - 1)
+                  for start in range(0, filesize, self.PIECE_SIZE)]
+        pieces = [(start, end) for start, end in pieces if journal.completed(start) < end - start + 1]
+
+        progress = _Progress(stream, filesize - journal.total(), progress_callback)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.segments, len(pieces)))) as executor:
+            futures = [executor.submit(self._download_piece, stream.url, part_path, start, end, progress, journal)
+                       for start, end in pieces]
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                executor.shutdown(cancel_futures=True)
+                journal.save(force=True)
+                raise
+
+        # Never rename a preallocated file with gaps, the journal stays for the next attempt
+        if journal.total() != filesize:
+            journal.save(force=True)
+            raise IOError(f"Incomplete download: {journal.total()} of {filesize} bytes")
+        os.replace(part_path, output_path)
+        journal.remove()
+        return output_path
+
+    def stream_to(self, stream, file, progress_callback: any = None) -> None:
+        """ Writes the stream to a pipe or file object in order, nothing is kept on disk """
+        filesize = stream.filesize
+        progress = _Progress(stream, filesize, progress_callback)
+        for start in range(0, filesize, self.PIECE_SIZE):
+            end = min(start + self.PIECE_SIZE, filesize) - 1
+            with self.session.get(stream.url, headers={"Range": f"bytes={start}-{end}"}, stream=True,
+                                  timeout=self.TIMEOUT) as response:
+                response.raise_for_status()
+                check_range(response, start, end, filesize)
+                received = 0
+                for chunk in response.iter_content(self.CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > end - start + 1:
+                        raise IOError(f"Server sent more than bytes {start}-{end}")
+                    self.throttle(len(chunk))
+                    file.write(chunk)
+                    progress.update(chunk)
+
+            if received != end - start + 1:
+                raise IOError(f"Connection closed after {received} of {end - start + 1} bytes at {start}")
+
+    def _download_piece(self, url: str, part_path: str, start: int, end: int, progress: "_Progress",
+                        journal: "Journal") -> None:
+        # Continue from the last byte written by a previous run
+        offset = start + journal.completed(start)
+        headers = {"Range": f"bytes={offset}-{end}"}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.TIMEOUT) as response:
+            response.raise_for_status()
+            check_range(response, offset, end, journal.filesize)
+
+            with open(part_path, 'r+b') as file:
+                file.seek(offset)
+                for chunk in response.iter_content(self.CHUNK_SIZE):
+                    if journal.completed(start) + len(chunk) > end - start + 1:
+                        raise IOError(f"Server sent more than bytes {offset}-{end}")
+                    self.throttle(len(chunk))
+                    file.write(chunk)
+                    journal.add(start, len(chunk))
+                    progress.update(chunk)
+
+        journal.save()
+        # iter_content just ends when the server closes the connection early
+        if journal.completed(start) != end - start + 1:
+            raise IOError(f"Connection closed after {journal.completed(start)} of {end - start + 1} bytes "
+                          f"at {start}")
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def throttle(self, size: int) -> None:
+        # Called for every chunk, so a cancelled job stops within one chunk per connection
+        if self.cancelled.is_set():
+            raise DownloadCancelled()
+        for limiter in self.limiters:
+            limiter.consume(size)
+
+
+class Journal:
+    """ Bytes written per piece of a .part file, kept next to it so an interrupted download can resume """
+
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, path: str, itag: int, filesize: int, piece_size: int, done: dict = None):
+        self.path = path
+        self.itag = itag
+        self.filesize = filesize
+        self.piece_size = piece_size
+        self.done = done or {}
+        self.lock = threading.Lock()
+        self.last_save = 0.0
+
+    @classmethod
+    def load(cls, path: str, itag: int, filesize: int, piece_size: int) -> "Journal":
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+            if (data["itag"], data["filesize"], data["piece_size"]) == (itag, filesize, piece_size):
+                done = {int(start): size for start, size in data["done"].items()}
+                return cls(path, itag, filesize, piece_size, done)
+        except (OSError, ValueError, KeyError):
+            pass
+        return cls(path, itag, filesize, piece_size)
+
+    def completed(self, start: int) -> int:
+        with self.lock:
+            return self.done.get(start, 0)
+
+    def total(self) -> int:
+        with self.lock:
+            return sum(self.done.values())
+
+    def add(self, start: int, size: int) -> None:
+        with self.lock:
+            self.done[start] = self.done.get(start, 0) + size
+        self.save()
+
+    def save(self, force: bool = False) -> None:
+        with self.lock:
+            if not force and time.time() - self.last_save < self.SAVE_INTERVAL:
+                return
+            self.last_save = time.time()
+            data = {"itag": self.itag, "filesize": self.filesize, "piece_size": self.piece_size, "done": self.done}
+
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+            os.replace(temp_path, self.path)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class _Progress:
+    def __init__(self, stream, bytes_remaining: int, progress_callback: any):
+        self.stream = stream
+        self.bytes_remaining = bytes_remaining
+        self.progress_callback = progress_callback
+        self.lock = threading.Lock()
+
+    def update(self, chunk: bytes) -> None:
+        with self.lock:
+            self.bytes_remaining -= len(chunk)
+            bytes_remaining = self.bytes_remaining
+
+        # Same signature as pytube's on_progress callback
+        if self.progress_callback:
+            self.progress_callback(self.stream, chunk, bytes_remaining)
@@ -1,10 +1,10 @@
 import glob
 import os
+import shutil
 import sys
 import traceback
-from pathlib import Path
 
-import validators
+from src.workspace import has_downloads, is_workspace, workspace_root
 
 
 def exception_hook(exctype, value, tb):
@@ -12,10 +12,18 @@ def exception_hook(exctype, value, tb):
     print(''.join(traceback.format_exception(exctype, value, tb)))
 
     # Code to run when the app crashes
-    download_dir = str(Path(__file__).parent / "assets" / "downloads")
-    files_to_remove = glob.glob(f'{download_dir}/*')
-    for file in files_to_remove:
-        os.remove(file)
+    from src.config import cfg  # src.config imports this module
+    clean_download_dir(cfg.get(cfg.scratchFolder))
+
+
+def clean_download_dir(download_dir: str) -> None:
+    # Only job folders the app created, kept while they hold downloaded streams so the next run can resume them
+    for path in glob.glob(f'{workspace_root(download_dir)}/*'):
+        try:
+            if os.path.isdir(path) and is_workspace(path) and not has_downloads(path):
+                shutil.rmtree(path)
+        except OSError:
+            pass
 
 
 def isWin11():
@@ -23,6 +31,7 @@ def isWin11():
 
 
 def validate_url(url: str) -> bool:
+    import validators  # deferred, only needed once the user searches
     return validators.url(url)
 
 
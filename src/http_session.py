@@ -0,0 +1,86 @@
+import json
+import socket
+import threading
+from urllib.error import HTTPError
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_TIMEOUT = 15
+
+_session = None
+_settings = None
+_lock = threading.Lock()
+
+
+class PooledSession(requests.Session):
+    """ Keep-alive session with a connection pool per host and a default timeout on every request """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: int = DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def configure_session(pool_size: int = DEFAULT_POOL_SIZE, timeout: int = DEFAULT_TIMEOUT) -> PooledSession:
+    global _session, _settings
+
+    with _lock:
+        # Only rebuild when the settings change, otherwise open connections would be dropped
+        if _session is None or _settings != (pool_size, timeout):
+            _session = PooledSession(pool_size, timeout)
+            _settings = (pool_size, timeout)
+        return _session
+
+
+def get_session() -> PooledSession:
+    return _session or configure_session()
+
+
+class _PytubeResponse:
+    """ The parts of a urllib response that pytube reads """
+
+    def __init__(self, response: requests.Response):
+        self.response = response
+
+    def read(self, amt: int = None) -> bytes:
+        if amt is None:
+            return self.response.content
+        return self.response.raw.read(amt, decode_content=True)
+
+    def info(self):
+        return self.response.headers
+
+
+def _execute_request(url, method=None, headers=None, data=None, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+    # Same headers, body encoding and errors as pytube.request._execute_request, over the pooled session
+    base_headers = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
+    if headers:
+        base_headers.update(headers)
+    if data and not isinstance(data, bytes):
+        data = bytes(json.dumps(data), encoding="utf-8")
+    if not url.lower().startswith("http"):
+        raise ValueError("Invalid URL")
+
+    kwargs = {} if timeout is socket._GLOBAL_DEFAULT_TIMEOUT else {"timeout": timeout}
+    response = get_session().request(method or ("POST" if data else "GET"), url, headers=base_headers, data=data,
+                                     stream=True, **kwargs)
+    if response.status_code >= 400:
+        response.close()
+        raise HTTPError(url, response.status_code, response.reason, response.headers, None)
+    return _PytubeResponse(response)
+
+
+def route_pytube_requests() -> None:
+    """ Sends pytube's watch page, player and playlist requests through the pooled session """
+    from pytube import request
+
+    request._execute_request = _execute_request
@@ -5,17 +5,20 @@ from PyQt5.QtGui import QDesktopServices
 from PyQt5.QtWidgets import QFrame, QVBoxLayout, QWidget, QLabel, QFileDialog, QHBoxLayout, QSpacerItem, \
     QSizePolicy
 from qfluentwidgets import FluentIcon as FIF, PushButton, InfoBarPosition, TitleLabel, SubtitleLabel, \
-    HyperlinkLabel, FluentIcon, ImageLabel, BodyLabel, InfoBarIcon, MessageBoxBase
+    HyperlinkLabel, FluentIcon, ImageLabel, BodyLabel, InfoBarIcon, MessageBoxBase, SingleDirectionScrollArea, \
+    ComboBox
 from qfluentwidgets import ScrollArea, ExpandLayout, \
     PushSettingCard, SettingCardGroup, SwitchSettingCard, OptionsSettingCard, CustomColorSettingCard, HyperlinkCard, \
-    PrimaryPushSettingCard, isDarkTheme, InfoBar, Theme, setTheme, setThemeColor
+    PrimaryPushSettingCard, RangeSettingCard, isDarkTheme, InfoBar, Theme, setTheme, setThemeColor
 
 from src.config import cfg, HELP_URL, YEAR, AUTHOR, VERSION, FEEDBACK_URL
-from src.dialog import DownloadDialog
+from src.download_queue import download_queue
 from src.functions import isWin11
+from src.profiling import DIAGNOSTICS_PATH
+from src.rate_limiter import MBIT, set_global_rate, set_job_rate
 from src.threads import UpdateThread
-from src.updater import restart_app
-from src.widgets import PlayListCardWidget, GuideWidget, SearchWidget
+from src.widgets import PlayListCardWidget, GuideWidget, SearchWidget, QueueItemWidget, load_image, \
+    show_queued_info
 
 ICONS = {
     "1": str(Path(__file__).parent / "assets" / "icons" / "1.png"),
@@ -45,7 +48,8 @@ class PlaylistInterface(QFrame):
         self.detail_layout = QVBoxLayout()
         self.detail_layout.setContentsMargins(10, 10, 10, 10)
 
-        self.search_widget = SearchWidget(self, self.view_layout, self._preview_ui, "playlist")
+        self.search_widget = SearchWidget(self, self.view_layout, self._preview_ui, "playlist", self._preview_item_ui)
+        self.playlist_card = None
 
         # Add Layouts
         self.main_layout.addWidget(self.search_widget)
@@ -53,8 +57,16 @@ class PlaylistInterface(QFrame):
 
     def _preview_ui(self, playlist_info: dict) -> None:
         if playlist_info:
-            playlist_card = PlayListCardWidget(self.parent, playlist_info)
-            self.view_layout.addWidget(playlist_card)
+            self.playlist_card = PlayListCardWidget(self.parent, playlist_info)
+            self.view_layout.addWidget(self.playlist_card)
+
+    def _preview_item_ui(self, index: int, video_info: dict) -> None:
+        if self.playlist_card:
+            self.playlist_card.add_video(index, video_info)
+
+
+# Only MP3 is encoded, the other formats copy the audio stream into a new container
+AUDIO_FORMAT_LABELS = {"mp3": "MP3 (convert)", "m4a": "M4A (copy)", "opus": "Opus (copy)", "webm": "WebM (copy)"}
 
 
 class DownloadInterface(QWidget):
@@ -88,11 +100,12 @@ class DownloadInterface(QWidget):
     def _preview_ui(self, video_info: dict) -> None:
         image = video_info["thumbnail_path"]
         title = video_info["title"]
+        self.video_title = title
         views = video_info["views"]
         publish_date = video_info["publish_date"]
         detail = f"{views}, {publish_date}"
 
-        self.video_image = ImageLabel(image=image)
+        self.video_image = ImageLabel(image=load_image(image))
         self.video_image.setFixedSize(400, 200)
         self.video_image.setBorderRadius(5, 5, 5, 5)
 
@@ -115,12 +128,101 @@ class DownloadInterface(QWidget):
         self.download_btn.setFixedSize(180, 35)
         self.download_btn.clicked.connect(self.download_callback)
 
+        if self.download_as == "audio":
+            self._add_format_box()
+
         self.view_layout.addWidget(self.download_btn, Qt.AlignLeft)
 
+    def _add_format_box(self) -> None:
+        self.format_box = ComboBox(self)
+        self.format_box.setFixedWidth(180)
+        for audio_format, label in AUDIO_FORMAT_LABELS.items():
+            self.format_box.addItem(label, userData=audio_format)
+        self.format_box.setCurrentIndex(list(AUDIO_FORMAT_LABELS).index(cfg.get(cfg.audioFormat)))
+        self.format_box.currentIndexChanged.connect(
+            lambda: cfg.set(cfg.audioFormat, self.format_box.currentData()))
+
+        self.detail_layout.insertWidget(self.detail_layout.indexOf(self.info) + 1, self.format_box)
+
     def download_callback(self) -> None:
         url = self.search_widget.url
-        dialog = DownloadDialog(self.parent, url, self.download_as)
-        dialog.exec()
+        audio_format = cfg.get(cfg.audioFormat) if self.download_as == "audio" else None
+        download_queue().add(url, self.download_as, self.video_title, audio_format=audio_format)
+        show_queued_info(self.parent, self.video_title)
+
+
+class QueueInterface(QWidget):
+    def __init__(self, parent):
+        super().__init__(parent=parent)
+        self.setObjectName("queue_interface")
+
+        self.parent = parent
+        self.items = {}
+        self.queue = download_queue()
+
+        self.main_layout = QVBoxLayout()
+        self.main_layout.setContentsMargins(20, 20, 20, 20)
+
+        self.setLayout(self.main_layout)
+
+        self._init_layout()
+        self._connect_signal_to_slot()
+
+    def _init_layout(self) -> None:
+        self.top_layout = QHBoxLayout()
+        self.title = SubtitleLabel(text="Download queue")
+        self.clear_btn = PushButton(text="Clear completed", icon=FIF.BROOM)
+        self.clear_btn.clicked.connect(self.queue.clear_finished)
+        self.top_layout.addWidget(self.title)
+        self.top_layout.addStretch(1)
+        self.top_layout.addWidget(self.clear_btn)
+
+        self.scroll_area = SingleDirectionScrollArea(orient=Qt.Vertical)
+        self.view = QWidget()
+        self.view_layout = QVBoxLayout(self.view)
+        self.view_layout.setContentsMargins(0, 10, 0, 10)
+        self.view_layout.setAlignment(Qt.AlignTop)
+        self.scroll_area.setWidget(self.view)
+        self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.setStyleSheet("QScrollArea{background: transparent; border: none}")
+        self.view.setStyleSheet("QWidget{background: transparent}")
+
+        self.main_layout.addLayout(self.top_layout)
+        self.main_layout.addWidget(self.scroll_area)
+
+        for job in self.queue.jobs:
+            self.add_item(job.id)
+        self.reorder_items()
+
+    def _connect_signal_to_slot(self) -> None:
+        self.queue.job_added.connect(self.add_item)
+        self.queue.job_changed.connect(self.update_item)
+        self.queue.job_removed.connect(self.remove_item)
+        self.queue.order_changed.connect(self.reorder_items)
+        self.queue.job_finished.connect(self.reorder_items)
+
+    def add_item(self, job_id: str) -> None:
+        item = QueueItemWidget(self.view, self.queue.get(job_id))
+        self.items[job_id] = item
+        self.view_layout.addWidget(item)
+
+    def update_item(self, job_id: str) -> None:
+        if job_id in self.items:
+            self.items[job_id].update_job(self.queue.get(job_id))
+
+    def remove_item(self, job_id: str) -> None:
+        item = self.items.pop(job_id, None)
+        if item:
+            item.deleteLater()
+
+    def reorder_items(self) -> None:
+        # Running jobs first, then pending ones in the order they will start, finished ones last
+        jobs = [job for job in self.queue.jobs if job.status == "running"] + self.queue.ordered() + \
+               [job for job in self.queue.jobs if job.status in ("done", "failed")]
+        for job in jobs:
+            item = self.items[job.id]
+            self.view_layout.removeWidget(item)
+            self.view_layout.addWidget(item)
 
 
 class HomeInterface(QWidget):
@@ -208,6 +310,140 @@ class SettingInterface(ScrollArea):
             self.folder_group
         )
 
+        self.scratch_folder_card = PushSettingCard(
+            self.tr('Choose folder'),
+            FIF.FOLDER,
+            self.tr("Temporary files"),
+            cfg.get(cfg.scratchFolder),
+            self.folder_group
+        )
+
+        self.download_group = SettingCardGroup(self.tr("Downloads"), self.scroll_widget)
+
+        self.max_workers_card = RangeSettingCard(
+            cfg.maxWorkers,
+            FIF.SPEED_HIGH,
+            self.tr("Parallel downloads"),
+            self.tr("Number of playlist videos downloaded at the same time"),
+            self.download_group
+        )
+
+        self.search_workers_card = RangeSettingCard(
+            cfg.searchWorkers,
+            FIF.SEARCH,
+            self.tr("Parallel playlist lookups"),
+            self.tr("Number of playlist videos looked up at the same time for the preview"),
+            self.download_group
+        )
+
+        self.segments_card = RangeSettingCard(
+            cfg.segments,
+            FIF.CLOUD_DOWNLOAD,
+            self.tr("Connections per file"),
+            self.tr("Large videos are split into parts that are downloaded over parallel connections"),
+            self.download_group
+        )
+
+        self.streaming_card = SwitchSettingCard(
+            FIF.SYNC,
+            self.tr("Stream into ffmpeg"),
+            self.tr("Convert while downloading without temporary files, interrupted downloads can't be resumed"),
+            cfg.streamingEnabled,
+            self.download_group
+        )
+
+        self.max_bandwidth_card = RangeSettingCard(
+            cfg.maxBandwidth,
+            FIF.SPEED_MEDIUM,
+            self.tr("Bandwidth limit (Mbit/s)"),
+            self.tr("Shared by all downloads, 0 means unlimited"),
+            self.download_group
+        )
+
+        self.job_bandwidth_card = RangeSettingCard(
+            cfg.jobBandwidth,
+            FIF.SPEED_OFF,
+            self.tr("Bandwidth limit per download (Mbit/s)"),
+            self.tr("Keeps a single large job from using the whole limit, 0 means unlimited"),
+            self.download_group
+        )
+
+        self.thumbnail_cache_card = RangeSettingCard(
+            cfg.thumbnailCacheSize,
+            FIF.PHOTO,
+            self.tr("Thumbnail cache size (MB)"),
+            self.tr("Thumbnails are kept on disk and the least recently used are removed first"),
+            self.download_group
+        )
+
+        self.queue_group = SettingCardGroup(self.tr("Queue"), self.scroll_widget)
+
+        self.max_active_jobs_card = RangeSettingCard(
+            cfg.maxActiveJobs,
+            FIF.DOWNLOAD,
+            self.tr("Jobs at the same time"),
+            self.tr("Queued downloads that run at once, of any type"),
+            self.queue_group
+        )
+
+        self.max_video_jobs_card = RangeSettingCard(
+            cfg.maxVideoJobs,
+            FIF.VIDEO,
+            self.tr("Video jobs at the same time"),
+            self.tr("At most this many of the running jobs are videos"),
+            self.queue_group
+        )
+
+        self.max_audio_jobs_card = RangeSettingCard(
+            cfg.maxAudioJobs,
+            FIF.MUSIC,
+            self.tr("MP3 jobs at the same time"),
+            self.tr("At most this many of the running jobs are audio downloads"),
+            self.queue_group
+        )
+
+        self.max_playlist_jobs_card = RangeSettingCard(
+            cfg.maxPlaylistJobs,
+            FIF.MEDIA,
+            self.tr("Playlist jobs at the same time"),
+            self.tr("Each playlist already downloads several videos in parallel"),
+            self.queue_group
+        )
+
+        self.diagnostics_group = SettingCardGroup(self.tr("Diagnostics"), self.scroll_widget)
+
+        self.metrics_card = SwitchSettingCard(
+            FIF.MARKET,
+            self.tr("Record stage metrics"),
+            self.tr("Time, size and outcome of every download step as JSON lines and a Prometheus file"),
+            cfg.metricsEnabled,
+            self.diagnostics_group
+        )
+
+        self.metrics_folder_card = PushSettingCard(
+            self.tr('Choose folder'),
+            FIF.FOLDER,
+            self.tr("Metrics folder"),
+            cfg.get(cfg.metricsFolder),
+            self.diagnostics_group
+        )
+
+        self.profiling_card = SwitchSettingCard(
+            FIF.DEVELOPER_TOOLS,
+            self.tr("Profile downloads and searches"),
+            self.tr("Writes a cProfile and an allocation report per run, slows the app down"),
+            cfg.profilingEnabled,
+            self.diagnostics_group
+        )
+
+        self.diagnostics_folder_card = PushSettingCard(
+            self.tr('Open folder'),
+            FIF.FOLDER,
+            self.tr("Profiling reports"),
+            str(DIAGNOSTICS_PATH),
+            self.diagnostics_group
+        )
+
         self.personal_group = SettingCardGroup(self.tr('Personalization'), self.scroll_widget)
 
         self.mica_card = SwitchSettingCard(
@@ -285,6 +521,25 @@ class SettingInterface(ScrollArea):
 
         # add cards to group
         self.folder_group.addSettingCard(self.download_folder_card)
+        self.folder_group.addSettingCard(self.scratch_folder_card)
+
+        self.download_group.addSettingCard(self.max_workers_card)
+        self.download_group.addSettingCard(self.search_workers_card)
+        self.download_group.addSettingCard(self.segments_card)
+        self.download_group.addSettingCard(self.streaming_card)
+        self.download_group.addSettingCard(self.max_bandwidth_card)
+        self.download_group.addSettingCard(self.job_bandwidth_card)
+        self.download_group.addSettingCard(self.thumbnail_cache_card)
+
+        self.queue_group.addSettingCard(self.max_active_jobs_card)
+        self.queue_group.addSettingCard(self.max_video_jobs_card)
+        self.queue_group.addSettingCard(self.max_audio_jobs_card)
+        self.queue_group.addSettingCard(self.max_playlist_jobs_card)
+
+        self.diagnostics_group.addSettingCard(self.metrics_card)
+        self.diagnostics_group.addSettingCard(self.metrics_folder_card)
+        self.diagnostics_group.addSettingCard(self.profiling_card)
+        self.diagnostics_group.addSettingCard(self.diagnostics_folder_card)
 
         self.personal_group.addSettingCard(self.mica_card)
         self.personal_group.addSettingCard(self.theme_card)
@@ -298,6 +553,9 @@ class SettingInterface(ScrollArea):
         self.expand_layout.setSpacing(28)
         self.expand_layout.setContentsMargins(60, 10, 60, 0)
         self.expand_layout.addWidget(self.folder_group)
+        self.expand_layout.addWidget(self.download_group)
+        self.expand_layout.addWidget(self.queue_group)
+        self.expand_layout.addWidget(self.diagnostics_group)
         self.expand_layout.addWidget(self.personal_group)
         self.expand_layout.addWidget(self.about_group)
 
@@ -328,6 +586,28 @@ class SettingInterface(ScrollArea):
         cfg.set(cfg.downloadFolder, folder)
         self.download_folder_card.setContent(folder)
 
+    def __on_scratch_folder_card_clicked(self):
+        folder = QFileDialog.getExistingDirectory(
+            self, self.tr("Choose folder"), "./")
+        if not folder or cfg.get(cfg.scratchFolder) == folder:
+            return
+
+        cfg.set(cfg.scratchFolder, folder)
+        self.scratch_folder_card.setContent(folder)
+
+    def __on_metrics_folder_card_clicked(self):
+        folder = QFileDialog.getExistingDirectory(
+            self, self.tr("Choose folder"), "./")
+        if not folder or cfg.get(cfg.metricsFolder) == folder:
+            return
+
+        cfg.set(cfg.metricsFolder, folder)
+        self.metrics_folder_card.setContent(folder)
+
+    def __on_diagnostics_folder_card_clicked(self):
+        DIAGNOSTICS_PATH.mkdir(parents=True, exist_ok=True)
+        QDesktopServices.openUrl(QUrl.fromLocalFile(str(DIAGNOSTICS_PATH)))
+
     def __on_theme_changed(self, theme: Theme):
         setTheme(theme)
 
@@ -357,7 +637,7 @@ class SettingInterface(ScrollArea):
 
             # Add custom components
             restart_btn = PushButton(text='Restart now')
-            restart_btn.clicked.connect(restart_app)
+            restart_btn.clicked.connect(self.__restart_app)
             show_msg.addWidget(restart_btn)
             show_msg.show()
         else:
@@ -374,12 +654,28 @@ class SettingInterface(ScrollArea):
 
             show_msg.show()
 
+    def __restart_app(self) -> None:
+        from src.updater import restart_app
+        restart_app()
+
     def __connect_signal_to_slot(self):
         cfg.appRestartSig.connect(self.__show_restart_tooltip)
         cfg.themeChanged.connect(self.__on_theme_changed)
 
         self.download_folder_card.clicked.connect(
             self.__on_download_folder_card_clicked)
+        self.scratch_folder_card.clicked.connect(
+            self.__on_scratch_folder_card_clicked)
+        self.metrics_folder_card.clicked.connect(
+            self.__on_metrics_folder_card_clicked)
+        self.diagnostics_folder_card.clicked.connect(self.__on_diagnostics_folder_card_clicked)
+
+        # Running downloads pick up a new limit right away
+        cfg.maxBandwidth.valueChanged.connect(lambda value: set_global_rate(value * MBIT))
+        cfg.jobBandwidth.valueChanged.connect(lambda value: set_job_rate(value * MBIT))
+        # Raised limits start waiting jobs right away, lowered ones apply as running jobs finish
+        for item in (cfg.maxActiveJobs, cfg.maxVideoJobs, cfg.maxAudioJobs, cfg.maxPlaylistJobs):
+            item.valueChanged.connect(lambda _: download_queue().schedule())
 
         self.mica_card.checkedChanged.connect(self.mica_enable_changed)
         self.theme_color_card.colorChanged.connect(setThemeColor)
@@ -0,0 +1,54 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+CACHE_PATH = Path(__file__).parent / "config" / "metadata.db"
+
+_lock = threading.Lock()
+
+
+class MetadataCache:
+    """ SQLite store of raw video and playlist metadata, view counts expire sooner than the rest """
+
+    def __init__(self, path: str | Path = CACHE_PATH, ttl: int = 7 * 24 * 3600, views_ttl: int = 3600):
+        self.path = str(path)
+        self.ttl = ttl
+        self.views_ttl = views_ttl
+
+        with _lock, closing(self._connect()) as connection, connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                               "fetched_at REAL NOT NULL, views_fetched_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short lived connection per call, the cache is used from many worker threads
+        return sqlite3.connect(self.path, timeout=10)
+
+    def lookup(self, key: str) -> tuple[dict | None, bool]:
+        """ Returns the cached data (None when missing or expired) and whether its view count is still fresh """
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT data, fetched_at, views_fetched_at FROM metadata WHERE key = ?",
+                                     (key,)).fetchone()
+
+        now = time.time()
+        if row is None or now - row[1] > self.ttl:
+            return None, False
+        return json.loads(row[0]), now - row[2] <= self.views_ttl
+
+    def put(self, key: str, data: dict) -> None:
+        now = time.time()
+        with _lock, closing(self._connect()) as connection, connection:
+            connection.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(data), now, now))
+
+    def update_views(self, key: str, views: int) -> None:
+        with _lock, closing(self._connect()) as connection, connection:
+            row = connection.execute("SELECT data FROM metadata WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            data = json.loads(row[0])
+            data["views"] = views
+            connection.execute("UPDATE metadata SET data = ?, views_fetched_at = ? WHERE key = ?",
+                               (json.dumps(data), time.time(), key))
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+METRICS_PATH = Path(__file__).parent / "assets" / "metrics"
+JSONL_NAME = "stages.jsonl"
+PROMETHEUS_NAME = "ultrafetch.prom"
+
+# Seconds, from a cached lookup up to a long transfer
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 15, 60, 300, 1800)
+
+_metrics = None
+_lock = threading.Lock()
+
+
+class Metrics:
+    """ Duration, bytes and outcome of every stage, as JSON lines and in the Prometheus text format """
+
+    WRITE_INTERVAL = 5.0
+
+    def __init__(self, folder: str | Path = None):
+        self.folder = Path(folder) if folder else None
+        self.totals = {}
+        self.last_write = 0.0
+        self.lock = threading.Lock()
+
+        if self.folder:
+            self.folder.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name: str, size: int = 0, flush: bool = False, **fields):
+        """ Times the block, it can set "bytes" and "outcome" on the record it gets """
+        record = {"bytes": size, "outcome": "ok"}
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["outcome"] = "error"
+            record["error"] = str(e)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, {**fields, **record})
+            if flush:
+                self.flush()
+
+    def record(self, name: str, seconds: float, record: dict) -> None:
+        outcome = record["outcome"]
+        with self.lock:
+            total = self.totals.setdefault((name, outcome), {"count": 0, "seconds": 0.0, "bytes": 0,
+                                                             "buckets": [0] * len(BUCKETS)})
+            total["count"] += 1
+            total["seconds"] += seconds
+            total["bytes"] += record["bytes"]
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    total["buckets"][index] += 1
+
+            if self.folder:
+                line = json.dumps({"time": round(time.time(), 3), "stage": name, "seconds": round(seconds, 6),
+                                   **record})
+                with open(self.folder / JSONL_NAME, 'a', encoding='utf-8') as file:
+                    file.write(line + "\n")
+
+        if time.monotonic() - self.last_write >= self.WRITE_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.folder:
+            return
+
+        with self.lock:
+            self.last_write = time.monotonic()
+            text = self.prometheus()
+            # Written next to the file and renamed, so the node exporter never reads half of it
+            temp_path = self.folder / f".{PROMETHEUS_NAME}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                file.write(text)
+            os.replace(temp_path, self.folder / PROMETHEUS_NAME)
+
+    def prometheus(self) -> str:
+        lines = ["# HELP ultrafetch_stage_duration_seconds Time spent per download stage.",
+                 "# TYPE ultrafetch_stage_duration_seconds histogram"]
+        for (name, outcome), total in sorted(self.totals.items()):
+            labels = f'stage="{name}",outcome="{outcome}"'
+            for bound, count in zip(BUCKETS, total["buckets"]):
+                lines.append(f'ultrafetch_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'ultrafetch_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {total["count"]}')
+            lines.append(f'ultrafetch_stage_duration_seconds_sum{{{labels}}} {total["seconds"]:.6f}')
+            lines.append(f'ultrafetch_stage_duration_seconds_count{{{labels}}} {total["count"]}')
+
+        lines += ["# HELP ultrafetch_stage_bytes_total Bytes transferred per download stage.",
+                  "# TYPE ultrafetch_stage_bytes_total counter"]
+        for (name, outcome), total in sorted(self.totals.items()):
+            lines.append(f'ultrafetch_stage_bytes_total{{stage="{name}",outcome="{outcome}"}} {total["bytes"]}')
+        return "\n".join(lines) + "\n"
+
+
+def configure_metrics(folder: str | Path = None) -> Metrics:
+    """ Metrics are only written to files when a folder is given, otherwise they are just counted """
+    global _metrics
+
+    with _lock:
+        # Totals are kept across jobs, Prometheus counters must only ever grow
+        if _metrics is None or _metrics.folder != (Path(folder) if folder else None):
+            _metrics = Metrics(folder)
+        return _metrics
+
+
+def get_metrics() -> Metrics:
+    return _metrics or configure_metrics()
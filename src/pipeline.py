@@ -0,0 +1,87 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Pipeline:
+    """ Runs fetch, transcode and finalize as separate stages, so downloads and ffmpeg work at the same time """
+
+    def __init__(self, fetch_workers: int, transcode_workers: int = None):
+        self.fetch_workers = max(1, fetch_workers)
+        # An ffmpeg process mostly keeps one core busy
+        self.transcode_workers = max(1, transcode_workers or os.cpu_count() or 1)
+
+    def run(self, items: list, fetch: any, transcode: any, finalize: any, done_callback: any = None,
+            error_callback: any = None) -> int:
+        """ Passes every item through fetch(item) -> job, transcode(job) and finalize(job), returns the failures """
+        pending = queue.Queue()
+        for item in items:
+            pending.put(item)
+
+        # Bounded, so downloads wait while ffmpeg is behind instead of filling the scratch folder
+        transcode_queue = queue.Queue(maxsize=self.transcode_workers)
+        finalize_queue = queue.Queue(maxsize=self.transcode_workers)
+        failed = []
+        lock = threading.Lock()
+
+        def fail(item, error: Exception) -> None:
+            with lock:
+                failed.append(item)
+            if error_callback:
+                error_callback(item, error)
+
+        def fetch_worker() -> None:
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    job = fetch(item)
+                except Exception as e:
+                    fail(item, e)
+                    continue
+                transcode_queue.put((item, job))
+
+        def transcode_worker() -> None:
+            while (entry := transcode_queue.get()) is not None:
+                item, job = entry
+                try:
+                    transcode(job)
+                except Exception as e:
+                    fail(item, e)
+                    continue
+                finalize_queue.put(entry)
+
+        def finalize_worker() -> None:
+            while (entry := finalize_queue.get()) is not None:
+                item, job = entry
+                try:
+                    finalize(job)
+                    if done_callback:
+                        done_callback(item)
+                except Exception as e:
+                    fail(item, e)
+
+        fetch_workers = max(1, min(self.fetch_workers, len(items)))
+        transcode_workers = max(1, min(self.transcode_workers, len(items)))
+        fetchers = ThreadPoolExecutor(max_workers=fetch_workers)
+        transcoders = ThreadPoolExecutor(max_workers=transcode_workers)
+        finalizer = ThreadPoolExecutor(max_workers=1)
+
+        for _ in range(fetch_workers):
+            fetchers.submit(fetch_worker)
+        for _ in range(transcode_workers):
+            transcoders.submit(transcode_worker)
+        finalizer.submit(finalize_worker)
+
+        # Each stage is stopped once the one before it has drained
+        fetchers.shutdown()
+        for _ in range(transcode_workers):
+            transcode_queue.put(None)
+        transcoders.shutdown()
+        finalize_queue.put(None)
+        finalizer.shutdown()
+
+        return len(failed)
@@ -0,0 +1,84 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+from src.config import cfg
+
+DIAGNOSTICS_PATH = Path(__file__).parent / "assets" / "diagnostics"
+PROFILE_ENV = "ULTRAFETCH_PROFILE"
+TOP_ALLOCATIONS = 30
+
+_sessions = []
+_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    return cfg.get(cfg.profilingEnabled) or os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+
+def _profile_new_thread(frame, event, arg) -> None:
+    # Set by threading.setprofile, so every worker thread started during a session gets its own profiler
+    profile = cProfile.Profile()
+    with _lock:
+        for session in _sessions:
+            session.append(profile)
+    profile.enable()
+
+
+def profiled(run: any) -> any:
+    """ Profiles a QThread's run with cProfile and tracemalloc when profiling is enabled """
+
+    @wraps(run)
+    def wrapper(self, *args, **kwargs):
+        if not profiling_enabled():
+            return run(self, *args, **kwargs)
+
+        profiles = []
+        with _lock:
+            if not _sessions:
+                threading.setprofile(_profile_new_thread)
+                tracemalloc.start(10)
+            _sessions.append(profiles)
+        start_snapshot = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(run, self, *args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            with _lock:
+                _sessions.remove(profiles)
+                if not _sessions:
+                    threading.setprofile(None)
+                    tracemalloc.stop()
+
+            write_report(type(self).__name__, [profile, *profiles], snapshot.compare_to(start_snapshot, 'lineno'),
+                         seconds, peak)
+
+    return wrapper
+
+
+def write_report(name: str, profiles: list, allocations: list, seconds: float, peak: int) -> None:
+    DIAGNOSTICS_PATH.mkdir(parents=True, exist_ok=True)
+    base_path = DIAGNOSTICS_PATH / f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{name}"
+
+    # The thread itself and every worker thread it started, in one file for snakeviz or pstats
+    stats = pstats.Stats(profiles[0])
+    for profile in profiles[1:]:
+        stats.add(profile)
+    stats.dump_stats(f"{base_path}.prof")
+
+    with open(f"{base_path}.allocations.txt", 'w', encoding='utf-8') as file:
+        file.write(f"{name}: {seconds:.2f} s, {len(profiles)} threads, traced peak {peak / 1024 / 1024:.1f} MB\n")
+        file.write(f"Top {TOP_ALLOCATIONS} allocations still held at the end of the run:\n\n")
+        for statistic in allocations[:TOP_ALLOCATIONS]:
+            file.write(f"{statistic}\n")
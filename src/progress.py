@@ -0,0 +1,102 @@
+import math
+import threading
+import time
+
+
+def stream_parts(stream, bytes_remaining: int) -> list:
+    """ (key, filesize, bytes_remaining) of every stream behind a progress callback """
+    # A CombinedProgress is passed as the stream, it is split back into the streams it merges
+    if hasattr(stream, "parts"):
+        return stream.parts()
+    return [(stream.itag, stream.filesize, bytes_remaining)]
+
+
+class RateEstimator:
+    """ Exponentially weighted moving average of a transfer rate in bytes per second """
+
+    MIN_INTERVAL = 0.5  # shorter samples are merged, chunks arrive in bursts
+
+    def __init__(self, time_constant: float = 3.0):
+        self.time_constant = time_constant
+        self.rate = None
+        self.last_time = None
+        self.last_done = 0
+
+    def update(self, done: int, now: float) -> None:
+        if self.last_time is None:
+            # The first sample only marks the start, so time spent before the transfer doesn't count
+            self.last_time, self.last_done = now, done
+            return
+
+        elapsed = now - self.last_time
+        if elapsed < self.MIN_INTERVAL:
+            return
+
+        sample = (done - self.last_done) / elapsed
+        # Samples are irregular, so the weight depends on how much time they cover
+        alpha = 1 - math.exp(-elapsed / self.time_constant)
+        self.rate = sample if self.rate is None else self.rate + alpha * (sample - self.rate)
+        self.last_time, self.last_done = now, done
+
+
+class ProgressTracker:
+    """ Progress and speed per stream and stage, reported to the UI at a fixed rate """
+
+    UPDATE_INTERVAL = 0.2
+
+    def __init__(self, update_interval: float = UPDATE_INTERVAL):
+        self.update_interval = update_interval
+        self.stage = "download"
+        self.streams = {}
+        self.estimators = {}
+        self.last_update = {}
+        self.lock = threading.Lock()
+
+    def start_stage(self, stage: str) -> None:
+        with self.lock:
+            self.stage = stage
+
+    def update(self, key, filesize: int, bytes_remaining: int) -> None:
+        now = time.monotonic()
+        with self.lock:
+            self.streams[key] = (filesize, bytes_remaining)
+            # A stream waiting for its turn would pull its estimate towards zero
+            if bytes_remaining < filesize:
+                estimator = self.estimators.setdefault((self.stage, key), RateEstimator())
+                estimator.update(filesize - bytes_remaining, now)
+
+    def due(self, key=None, force: bool = False) -> bool:
+        """ True at most once per update interval and key, force is for updates that must not be dropped """
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.last_update.get(key, 0) < self.update_interval:
+                return False
+            self.last_update[key] = now
+            return True
+
+    def done(self) -> bool:
+        with self.lock:
+            return all(remaining == 0 for _, remaining in self.streams.values())
+
+    def percentage(self) -> int:
+        with self.lock:
+            sizes = list(self.streams.values())
+        total_size = sum(filesize for filesize, _ in sizes)
+        if not total_size:
+            return 0
+        return int((total_size - sum(remaining for _, remaining in sizes)) / total_size * 100)
+
+    def speed(self) -> float:
+        """ Combined rate of the streams of the current stage that are still transferring """
+        with self.lock:
+            return sum(estimator.rate or 0 for (stage, key), estimator in self.estimators.items()
+                       if stage == self.stage and self.streams.get(key, (0, 0))[1] > 0)
+
+    def eta(self) -> int | None:
+        """ Seconds left, None until there is a speed to estimate from """
+        with self.lock:
+            bytes_remaining = sum(remaining for _, remaining in self.streams.values())
+        speed = self.speed()
+        if not bytes_remaining:
+            return 0
+        return math.ceil(bytes_remaining / speed) if speed else None
@@ -1,34 +1,26 @@
 import os
 import re
 import subprocess
-import uuid
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Union, List
 
-import requests
-from pytube import YouTube, Playlist
+from pytube import YouTube, Playlist, extract
 
+from src.downloader import DownloadCancelled, SegmentedDownloader
 from src.functions import validate_url
+from src.http_session import get_session, route_pytube_requests
+from src.metadata_cache import MetadataCache
+from src.metrics import get_metrics
+from src.rate_limiter import global_limiter, job_limiter
+from src.thumbnail_cache import ThumbnailCache, thumbnail_variant
+from src.video_cache import get_video_cache
+from src.workspace import JobWorkspace, SCRATCH_PATH
 
-
-def remove_file(path: str) -> None:
-    try:
-        if os.path.isfile(path):
-            os.remove(path)
-    except Exception:
-        pass
-
-
-def remove_files(paths: Union[str, List[str]]) -> None:
-    try:
-        if isinstance(paths, list):
-            for path in paths:
-                remove_file(path)
-        else:
-            remove_file(paths)
-    except Exception:
-        pass
+# Otherwise every watch page, player and playlist request of pytube opens a new connection
+route_pytube_requests()
 
 
 def format_publish_date(publish_date: datetime) -> str:
@@ -70,123 +62,449 @@ def rename_title(title: str) -> str:
     return title
 
 
-class PytubeFunction:
-    CREATION_FLAGS = 0x08000000  # hides ffmpeg console
+class CombinedProgress:
+    """ Merges the progress of streams downloaded at the same time, weighted by their size """
 
-    def __init__(self, output_dir: str):
-        self.output_dir = output_dir
-        self.download_path = Path(__file__).parent / "assets" / "downloads"
+    def __init__(self, streams: list, progress_callback: any):
+        self.progress_callback = progress_callback
+        self.filesize = sum(stream.filesize for stream in streams)
+        self.filesizes = {stream.itag: stream.filesize for stream in streams}
+        self.remaining = dict(self.filesizes)
+        self.lock = threading.Lock()
 
-    def download_thumbnail(self, thumbnail_url: str) -> str:
-        if validate_url(thumbnail_url):
-            response = requests.get(thumbnail_url)
+    def __call__(self, stream, chunk: bytes, bytes_remaining: int) -> None:
+        with self.lock:
+            self.remaining[stream.itag] = bytes_remaining
+            total_remaining = sum(self.remaining.values())
 
-            if response.status_code == 200:
-                rand_filename = str(uuid.uuid4()) + '.jpg'
-                output = self.download_path / rand_filename
-                with open(output, 'wb') as file:
-                    file.write(response.content)
-                return str(output)
+        # Passed as the stream, it exposes the combined filesize to the callback
+        if self.progress_callback:
+            self.progress_callback(self, chunk, total_remaining)
 
-    def download_audio(self, url: str, progress_callback: any, complete_callback: any,
-                       all_complete_callback: any) -> None:
-        try:
-            if validate_url(url):
-                yt_obj = YouTube(url, progress_callback, complete_callback)
+    def parts(self) -> list:
+        with self.lock:
+            return [(itag, self.filesizes[itag], remaining) for itag, remaining in self.remaining.items()]
 
-                video_title = yt_obj.title
-                title = rename_title(video_title)
-                output_file = Path(self.output_dir) / f"{title}.mp3"
 
-                audio_stream = yt_obj.streams.filter(only_audio=True).order_by('abr').desc().first()
+class ReceivedBytes:
+    """ Counts the bytes a transfer actually received, a resumed one only fetches what was missing """
 
-                audio_path = audio_stream.download(output_path=str(self.download_path), filename='audio')
+    def __init__(self, progress_callback: any):
+        self.progress_callback = progress_callback
+        self.count = 0
+        self.lock = threading.Lock()
 
-                subprocess.run(['ffmpeg', '-y', '-i', audio_path, '-c:a', 'libmp3lame', output_file],
-                               creationflags=self.CREATION_FLAGS)
+    def __call__(self, stream, chunk: bytes, bytes_remaining: int) -> None:
+        with self.lock:
+            self.count += len(chunk)
+        if self.progress_callback:
+            self.progress_callback(stream, chunk, bytes_remaining)
 
-                # Clean up temp files
-                remove_files(str(audio_path))
 
-                # Process complete
-                all_complete_callback()
-        except Exception as e:
-            print(f"An error occurred: {e}")
+def mux_command(video_path: str, audio_path: str, audio_subtype: str, output_file: str | Path) -> list:
+    # One ffmpeg pass: the video track is always copied, AAC audio (mp4) is copied too,
+    # only Opus/Vorbis audio (webm) has to be encoded to fit the MP4 container
+    audio_codec = 'copy' if audio_subtype == 'mp4' else 'aac'
+    return ['ffmpeg', '-y', '-i', video_path, '-i', audio_path, '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy', '-c:a', audio_codec, '-movflags', '+faststart', str(output_file)]
 
-    def download_video(self, url: str, progress_callback: any, complete_callback: any,
-                       all_complete_callback: any) -> None:
-        if validate_url(url):
-            yt_obj = YouTube(url, progress_callback, complete_callback)
 
-            video_title = yt_obj.title
-            title = rename_title(video_title)
-            output_file = Path(self.output_dir) / f"{title}.mp4"
+# Audio output: the source stream type that can be copied as is, and the encoder for any other source
+AUDIO_FORMATS = {"mp3": (None, "libmp3lame"), "m4a": ("mp4", "aac"), "opus": ("webm", "libopus"),
+                 "webm": ("webm", "libopus")}
+
+
+def audio_command(input_path: str, audio_subtype: str, audio_format: str, output_file: str | Path) -> list:
+    # M4A, Opus and WebM only remux when the source already has their codec, MP3 is always encoded
+    source, encoder = AUDIO_FORMATS[audio_format]
+    audio_codec = 'copy' if audio_subtype == source else encoder
+    command = ['ffmpeg', '-y', '-i', input_path, '-vn', '-c:a', audio_codec]
+    if audio_format == "m4a":
+        command += ['-movflags', '+faststart']
+    return command + [str(output_file)]
+
 
-            video_stream = yt_obj.streams.filter(progressive=False, adaptive=True).order_by(
-                'resolution').desc().first()
-            audio_stream = yt_obj.streams.filter(only_audio=True).order_by('abr').desc().first()
+class MediaJob:
+    """ Downloaded streams of one video on their way through the transcode and finalize stages """
 
-            video_path = video_stream.download(output_path=str(self.download_path), filename='video')
-            audio_path = audio_stream.download(output_path=str(self.download_path), filename='audio')
+    def __init__(self, kind: str, video_id: str, itags: list, workspace: JobWorkspace, command: list,
+                 temp_output: str, output_file: Path):
+        self.kind = kind
+        self.video_id = video_id
+        self.itags = itags
+        self.workspace = workspace
+        self.command = command
+        self.temp_output = temp_output
+        self.output_file = output_file
 
-            video = self.download_path / "video.mp4"
-            audio = self.download_path / "audio.mp3"
 
-            subprocess.run(['ffmpeg', '-y', '-i', video_path, '-c:v', 'copy', video], creationflags=self.CREATION_FLAGS)
-            subprocess.run(['ffmpeg', '-y', '-i', audio_path, '-c:a', 'libmp3lame', audio],
-                           creationflags=self.CREATION_FLAGS)
-            subprocess.run(['ffmpeg', '-y', '-i', video, '-i', audio, '-c:v', 'copy', '-c:a', 'aac', output_file],
-                           creationflags=self.CREATION_FLAGS)
+class PytubeFunction:
+    CREATION_FLAGS = 0x08000000 if sys.platform == 'win32' else 0  # hides ffmpeg console
+
+    def __init__(self, output_dir: str, thumbnail_cache_size: int = 200 * 1024 * 1024,
+                 metadata_cache: MetadataCache = None, segments: int = 4, streaming: bool = False,
+                 scratch_dir: str = None, audio_format: str = "mp3"):
+        self.output_dir = output_dir
+        self.streaming = streaming
+        self.audio_format = audio_format
+        self.download_path = Path(scratch_dir or SCRATCH_PATH)
+        self.thumbnail_cache = ThumbnailCache(max_size=thumbnail_cache_size)
+        self.metadata_cache = metadata_cache or MetadataCache()
+        # One instance per job: its downloads share the job limit and, with all other jobs, the global limit
+        self.downloader = SegmentedDownloader(segments, limiters=[global_limiter(), job_limiter()])
+        self.processes = set()
+        self.lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """ Stops the transfers and ffmpeg processes of this job, partial downloads are kept for a resume """
+        self.downloader.cancel()
+        with self.lock:
+            for process in self.processes:
+                process.kill()
+
+    def check_cancelled(self) -> None:
+        if self.downloader.cancelled.is_set():
+            raise DownloadCancelled()
+
+    def download_thumbnail(self, thumbnail_url: str, video_id: str) -> str:
+        if validate_url(thumbnail_url):
+            with get_metrics().stage("thumbnail", video_id=video_id) as record:
+                variant = thumbnail_variant(thumbnail_url)
+                cached_path = self.thumbnail_cache.get(video_id, variant)
+                if cached_path:
+                    record["outcome"] = "cached"
+                    return cached_path
+
+                with get_session().get(thumbnail_url, stream=True) as response:
+                    if response.status_code == 200:
+                        path = self.thumbnail_cache.put_stream(video_id, variant, response.iter_content(64 * 1024))
+                        record["bytes"] = os.path.getsize(path)
+                        return path
+                record["outcome"] = "error"
+
+    def download_stream(self, stream, workspace: JobWorkspace, progress_callback: any,
+                        complete_callback: any) -> str:
+        output_path = workspace.file(f"{stream.itag}.{stream.subtype}")
+        received = ReceivedBytes(progress_callback)
+        with get_metrics().stage("transfer", itag=stream.itag) as record:
+            try:
+                self.downloader.download(stream, output_path, received)
+            finally:
+                record["bytes"] = received.count
+        if complete_callback:
+            complete_callback(stream, output_path)
+        return output_path
+
+    def workspace(self, video_id: str, kind: str) -> JobWorkspace:
+        # The audio format is part of the name, the same video can be queued as MP3 and M4A at the same time
+        name = f"{video_id}-audio-{self.audio_format}" if kind == "audio" else f"{video_id}-{kind}"
+        return JobWorkspace(self.download_path, name)
+
+    def resolve(self, url: str, kind: str) -> tuple:
+        """ Video id, streams and output file of a video, kind is "video" or "audio" """
+        with get_metrics().stage("watch_page", kind=kind) as record:
+            # Usually already resolved by the preview, the stream manifest is parsed and deciphered only once
+            yt_obj, cached = get_video_cache().video(url, YouTube, streams=True)
+            title = rename_title(yt_obj.title)
+            record["video_id"] = yt_obj.video_id
+            if cached:
+                record["outcome"] = "cached"
+
+        extension = self.audio_format if kind == "audio" else "mp4"
+        output_file = Path(self.output_dir) / f"{title}.{extension}"
+
+        with get_metrics().stage("stream_selection", kind=kind, video_id=yt_obj.video_id):
+            video_stream = None
+            audio_streams = yt_obj.streams.filter(only_audio=True)
+            if kind == "video":
+                video_stream = yt_obj.streams.filter(progressive=False, adaptive=True).order_by(
+                    'resolution').desc().first()
+            audio_stream = None
+            source = AUDIO_FORMATS[self.audio_format][0] if kind == "audio" else None
+            if source:
+                # The best stream that can be copied, even when a stream of another type has a higher bitrate
+                audio_stream = audio_streams.filter(subtype=source).order_by('abr').desc().first()
+            audio_stream = audio_stream or audio_streams.order_by('abr').desc().first()
+        return yt_obj.video_id, video_stream, audio_stream, output_file
+
+    def fetch(self, url: str, kind: str, progress_callback: any, complete_callback: any) -> MediaJob:
+        """ First stage: downloads the streams into a workspace that stays open for the next stages """
+        self.check_cancelled()
+        video_id, video_stream, audio_stream, output_file = self.resolve(url, kind)
+
+        workspace = self.workspace(video_id, kind).open()
+        try:
+            if kind == "audio":
+                audio_path = self.download_stream(audio_stream, workspace, progress_callback, complete_callback)
+                temp_output = workspace.file(f"output.{self.audio_format}")
+                command = audio_command(audio_path, audio_stream.subtype, self.audio_format, temp_output)
+            else:
+                # Both streams report into one progress, weighted by their sizes
+                combined_progress = CombinedProgress([video_stream, audio_stream], progress_callback)
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    video_future = executor.submit(self.download_stream, video_stream, workspace,
+                                                   combined_progress, complete_callback)
+                    audio_future = executor.submit(self.download_stream, audio_stream, workspace,
+                                                   combined_progress, complete_callback)
+                    video_path = video_future.result()
+                    audio_path = audio_future.result()
+
+                temp_output = workspace.file("output.mp4")
+                command = mux_command(video_path, audio_path, audio_stream.subtype, temp_output)
+        except Exception as e:
+            workspace.close(failed=True, cancelled=isinstance(e, DownloadCancelled))
+            get_video_cache().discard(video_id)
+            raise
+
+        itags = [stream.itag for stream in (video_stream, audio_stream) if stream]
+        return MediaJob(kind, video_id, itags, workspace, command, temp_output, output_file)
 
-            # Clean up temp files
-            remove_files([str(audio), str(audio_path), str(video), str(video_path)])
+    def transcode(self, job: MediaJob) -> None:
+        """ Second stage: the ffmpeg call, the only part that needs CPU """
+        try:
+            stage = "mux" if job.kind == "video" else "remux" if 'copy' in job.command else "transcode"
+            with get_metrics().stage(stage):
+                self.check_cancelled()
+                process = subprocess.Popen(job.command, creationflags=self.CREATION_FLAGS)
+                with self.lock:
+                    self.processes.add(process)
+                    # cancel() may have run between the check above and the start
+                    if self.downloader.cancelled.is_set():
+                        process.kill()
+                try:
+                    returncode = process.wait()
+                finally:
+                    with self.lock:
+                        self.processes.discard(process)
+                self.check_cancelled()
+                if returncode != 0:
+                    raise RuntimeError(f"ffmpeg exited with code {returncode}")
+        except Exception as e:
+            job.workspace.close(failed=True, cancelled=isinstance(e, DownloadCancelled))
+            raise
 
-            # Process complete
-            all_complete_callback()
+    def finalize(self, job: MediaJob) -> str:
+        """ Last stage: moves the output into the download folder and removes the workspace """
+        try:
+            with get_metrics().stage("finalize"):
+                return job.workspace.finalize(job.temp_output, job.output_file)
+        finally:
+            with get_metrics().stage("cleanup"):
+                job.workspace.close()
 
-    def search_playlist(self, url: str):
+    def download_audio(self, url: str, progress_callback: any, complete_callback: any,
+                       all_complete_callback: any) -> None:
         try:
+            with get_metrics().stage("download_audio", flush=True, url=url):
+                if validate_url(url):
+                    # A remux takes no time, there is nothing to overlap with the download
+                    if self.streaming and self.audio_format == "mp3":
+                        video_id, _, audio_stream, output_file = self.resolve(url, "audio")
+                        try:
+                            with self.workspace(video_id, "audio") as workspace:
+                                temp_output = workspace.file("output.mp3")
+                                # ffmpeg encodes from stdin while the stream is still downloading
+                                command = audio_command('pipe:0', audio_stream.subtype, "mp3", temp_output)
+                                process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                                           creationflags=self.CREATION_FLAGS)
+                                self.feed_process(process, audio_stream, progress_callback, complete_callback)
+                                workspace.finalize(temp_output, output_file)
+                        except Exception:
+                            get_video_cache().discard(video_id)
+                            raise
+                    else:
+                        job = self.fetch(url, "audio", progress_callback, complete_callback)
+                        self.transcode(job)
+                        self.finalize(job)
+
+                    # Process complete
+                    all_complete_callback()
+        except Exception as e:
+            print(f"An error occurred: {e}", file=sys.stderr)
+
+    def download_video(self, url: str, progress_callback: any, complete_callback: any,
+                       all_complete_callback: any) -> None:
+        with get_metrics().stage("download_video", flush=True, url=url):
             if validate_url(url):
-                p = Playlist(url)
-                title = p.title
-                owner = p.owner
-                videos = f"{p.length} videos"
-                views = format_view_count(p.views)
-                d = p.last_updated
-                if isinstance(d, str):
-                    updated = "N/A"
+                if self.streaming:
+                    video_id, video_stream, audio_stream, output_file = self.resolve(url, "video")
+                    combined_progress = CombinedProgress([video_stream, audio_stream], progress_callback)
+                    try:
+                        with self.workspace(video_id, "video") as workspace:
+                            temp_output = workspace.file("output.mp4")
+                            self.stream_video(workspace, video_stream, audio_stream, temp_output,
+                                              combined_progress, complete_callback)
+                            workspace.finalize(temp_output, output_file)
+                    except Exception:
+                        get_video_cache().discard(video_id)
+                        raise
                 else:
-                    dt = datetime.combine(d, datetime.min.time())
-                    updated = format_publish_date(dt)
+                    job = self.fetch(url, "video", progress_callback, complete_callback)
+                    self.transcode(job)
+                    self.finalize(job)
 
-                video_details = []
-                video_urls = []
-
-                for video_url in p.video_urls:
-                    video_urls.append(video_url)
-                    video_detail = self.quick_search(video_url)
-                    video_details.append(video_detail)
+                # Process complete
+                all_complete_callback()
 
-                return {"title": title, "owner": owner, "videos": videos, "views": views, "last_updated": updated,
-                        "video_info": video_details, "video_urls": video_urls}
+    def feed_process(self, process: subprocess.Popen, stream, progress_callback: any,
+                     complete_callback: any) -> None:
+        received = ReceivedBytes(progress_callback)
+        try:
+            with get_metrics().stage("transfer", itag=stream.itag, streamed=True) as record:
+                try:
+                    self.downloader.stream_to(stream, process.stdin, received)
+                finally:
+                    record["bytes"] = received.count
+        finally:
+            process.stdin.close()
+
+        if complete_callback:
+            complete_callback(stream, None)
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+
+    def stream_video(self, workspace: JobWorkspace, video_stream, audio_stream, output_file: str,
+                     progress_callback: any, complete_callback: any) -> None:
+        if not hasattr(os, 'mkfifo'):
+            # No named pipes on Windows: the small audio stream goes to disk, the video is piped through stdin
+            audio_path = self.download_stream(audio_stream, workspace, progress_callback, complete_callback)
+            process = subprocess.Popen(mux_command('pipe:0', audio_path, audio_stream.subtype, output_file),
+                                       stdin=subprocess.PIPE, creationflags=self.CREATION_FLAGS)
+            self.feed_process(process, video_stream, progress_callback, complete_callback)
+            return
+
+        video_pipe = workspace.file('video.pipe')
+        audio_pipe = workspace.file('audio.pipe')
+        for pipe in (video_pipe, audio_pipe):
+            if os.path.exists(pipe):
+                os.remove(pipe)
+            os.mkfifo(pipe)
+
+        command = mux_command(video_pipe, audio_pipe, audio_stream.subtype, output_file)
+        process = subprocess.Popen(command[:1] + ['-nostdin'] + command[1:], stdin=subprocess.DEVNULL)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(self.write_pipe, stream, pipe, progress_callback, complete_callback)
+                       for stream, pipe in ((video_stream, video_pipe), (audio_stream, audio_pipe))]
+            returncode = process.wait()
+
+            # Unblock writers still waiting for ffmpeg to open their pipe, they fail with a broken pipe
+            for pipe in (video_pipe, audio_pipe):
+                os.close(os.open(pipe, os.O_RDONLY | os.O_NONBLOCK))
+            for future in futures:
+                future.result()
+
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode}")
+
+    def write_pipe(self, stream, pipe: str, progress_callback: any, complete_callback: any) -> None:
+        received = ReceivedBytes(progress_callback)
+        with get_metrics().stage("transfer", itag=stream.itag, streamed=True) as record:
+            try:
+                with open(pipe, 'wb') as file:
+                    self.downloader.stream_to(stream, file, received)
+            finally:
+                record["bytes"] = received.count
+        if complete_callback:
+            complete_callback(stream, None)
+
+    def search_playlist(self, url: str, max_workers: int = 8, header_callback: any = None,
+                        video_callback: any = None):
+        try:
+            with get_metrics().stage("search_playlist", flush=True, url=url):
+                if validate_url(url):
+                    playlist = self.fetch_playlist(url)
+                    if playlist["last_updated"]:
+                        dt = datetime.fromisoformat(playlist["last_updated"])
+                        updated = format_publish_date(dt)
+                    else:
+                        updated = "N/A"
+
+                    video_urls = playlist["video_urls"]
+                    header = {"url": url, "title": playlist["title"], "owner": playlist["owner"],
+                              "videos": f"{playlist['length']} videos", "views": format_view_count(playlist["views"]),
+                              "last_updated": updated, "video_urls": video_urls}
+                    if header_callback:
+                        header_callback(header)
+
+                    # Resolve every video in parallel, each result goes back to its playlist slot
+                    video_details = [None] * len(video_urls)
+                    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                        futures = {executor.submit(self.quick_search, video_url): index
+                                   for index, video_url in enumerate(video_urls)}
+                        for future in as_completed(futures):
+                            index = futures[future]
+                            video_details[index] = future.result()
+                            if video_callback:
+                                video_callback(index, video_details[index])
+
+                    return {**header, "video_info": video_details}
         except Exception as e:
             return {"error": str(e)}
 
+    def fetch_playlist(self, url: str, refresh: bool = False) -> dict:
+        key = f"playlist:{extract.playlist_id(url)}"
+        with get_metrics().stage("playlist_page", key=key) as record:
+            playlist, views_fresh = self.metadata_cache.lookup(key)
+            # Views and the video list come from the same page, so a stale view count means a full refresh
+            if refresh or playlist is None or not views_fresh:
+                p = Playlist(url)
+                d = p.last_updated
+                playlist = {"title": p.title, "owner": p.owner, "length": p.length, "views": p.views,
+                            "last_updated": None if isinstance(d, str) or d is None else d.isoformat(),
+                            "video_urls": list(p.video_urls)}
+                self.metadata_cache.put(key, playlist)
+            else:
+                record["outcome"] = "cached"
+        return playlist
+
     def quick_search(self, url: str) -> dict:
         try:
-            if validate_url(url):
-                yt_obj = YouTube(url)
-                title = yt_obj.title
-                owner = yt_obj.author
-                channel_url = yt_obj.channel_url
-                thumbnail_url = yt_obj.thumbnail_url
-                thumbnail_path = self.download_thumbnail(thumbnail_url)
-                views = format_view_count(yt_obj.views)
-                publish_date = format_publish_date(yt_obj.publish_date)
-
-                return {"title": title, "owner": owner, "channel_url": channel_url, "thumbnail_url": thumbnail_url,
-                        "thumbnail_path": thumbnail_path,
-                        "views": views,
-                        "publish_date": publish_date}
+            with get_metrics().stage("quick_search", flush=True, url=url):
+                if validate_url(url):
+                    video = self.fetch_video(url)
+                    thumbnail_path = self.download_thumbnail(video["thumbnail_url"], video["video_id"])
+                    views = format_view_count(video["views"])
+                    if video["publish_date"]:
+                        publish_date = format_publish_date(datetime.fromisoformat(video["publish_date"]))
+                    else:
+                        publish_date = "N/A"
+
+                    return {"title": video["title"], "owner": video["owner"], "channel_url": video["channel_url"],
+                            "thumbnail_url": video["thumbnail_url"],
+                            "thumbnail_path": thumbnail_path,
+                            "views": views,
+                            "publish_date": publish_date}
         except Exception as e:
             return {"error": str(e)}
+
+    def prefetch_streams(self, url: str) -> None:
+        """ Resolves the stream manifest of a previewed video, so a download can start right away """
+        try:
+            with get_metrics().stage("prefetch_streams", url=url) as record:
+                _, cached = get_video_cache().video(url, YouTube, streams=True)
+                if cached:
+                    record["outcome"] = "cached"
+        except Exception as e:
+            # Only a head start, the download resolves the video itself
+            print(f"An error occurred: {e}", file=sys.stderr)
+
+    def fetch_video(self, url: str) -> dict:
+        key = f"video:{extract.video_id(url)}"
+        with get_metrics().stage("video_metadata", key=key) as record:
+            video, views_fresh = self.metadata_cache.lookup(key)
+            if video is None:
+                # Kept for the download, which then only has to resolve the streams
+                yt_obj, _ = get_video_cache().video(url, YouTube)
+                publish_date = yt_obj.publish_date
+                video = {"video_id": yt_obj.video_id, "title": yt_obj.title, "owner": yt_obj.author,
+                         "channel_url": yt_obj.channel_url, "thumbnail_url": yt_obj.thumbnail_url,
+                         "views": yt_obj.views, "publish_date": publish_date.isoformat() if publish_date else None}
+                self.metadata_cache.put(key, video)
+            elif not views_fresh:
+                # Only the player response is needed for the view count, the watch page is skipped
+                video["views"] = YouTube(url).views
+                self.metadata_cache.update_views(key, video["views"])
+                record["outcome"] = "views_refreshed"
+            else:
+                record["outcome"] = "cached"
+        return video
@@ -0,0 +1,78 @@
+import threading
+import time
+import weakref
+
+MBIT = 125000  # bytes per second in one Mbit/s
+
+
+class TokenBucket:
+    """ Limits throughput to a rate in bytes per second, a rate of 0 means unlimited """
+
+    MAX_WAIT = 0.25  # sleep in short slices, so a new rate applies to waiting downloads too
+
+    def __init__(self, rate: int = 0):
+        self.rate = rate
+        self.tokens = 0.0
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate: int) -> None:
+        with self.lock:
+            self.rate = max(0, rate)
+            self.tokens = min(self.tokens, float(self.rate))
+
+    def consume(self, size: int) -> None:
+        with self.lock:
+            if not self.rate:
+                return
+            self._refill()
+            # Take the tokens right away and wait off the debt, so a chunk larger than the bucket still passes
+            self.tokens -= size
+
+        while True:
+            with self.lock:
+                if not self.rate:
+                    return
+                self._refill()
+                if self.tokens >= 0:
+                    return
+                wait = -self.tokens / self.rate
+            time.sleep(min(wait, self.MAX_WAIT))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        # The bucket holds at most one second of traffic, so an idle period doesn't allow a long burst
+        self.tokens = min(float(self.rate), self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+
+_global_limiter = TokenBucket()
+_job_limiters = weakref.WeakSet()
+_job_rate = 0
+_lock = threading.Lock()
+
+
+def global_limiter() -> TokenBucket:
+    return _global_limiter
+
+
+def set_global_rate(rate: int) -> None:
+    _global_limiter.set_rate(rate)
+
+
+def job_limiter() -> TokenBucket:
+    """ New limiter for a single job, it follows later changes of the per job rate """
+    with _lock:
+        limiter = TokenBucket(_job_rate)
+        _job_limiters.add(limiter)
+    return limiter
+
+
+def set_job_rate(rate: int) -> None:
+    global _job_rate
+
+    with _lock:
+        _job_rate = rate
+        limiters = list(_job_limiters)
+    for limiter in limiters:
+        limiter.set_rate(rate)
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from pytube import extract
+
+from src.pipeline import Pipeline
+
+
+def file_hash(path: str | Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(1024 * 1024):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class PlaylistManifest:
+    """ Videos of a playlist that are already in the download folder, with their stream, size and hash """
+
+    def __init__(self, folder: str | Path, playlist_id: str, kind: str):
+        self.folder = Path(folder)
+        self.path = self.folder / f".{playlist_id}.{kind}.sync.json"
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                self.entries = json.load(file)["videos"]
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+
+    def is_current(self, video_id: str, verify: bool = False) -> bool:
+        """ Whether the file of a video is still there unchanged, checked without any network access """
+        with self.lock:
+            entry = self.entries.get(video_id)
+        if entry is None:
+            return False
+
+        path = self.folder / entry["output"]
+        try:
+            if os.path.getsize(path) != entry["size"]:
+                return False
+        except OSError:
+            return False
+        # Size is enough for a daily run, the hash catches files that were edited in place
+        return not verify or file_hash(path) == entry["sha256"]
+
+    def claim(self, video_id: str, output_file: str | Path) -> Path:
+        """ Output path for a video, a title already taken by another video gets the video id appended """
+        output_file = Path(output_file)
+        with self.lock:
+            owned = {entry["output"]: owner for owner, entry in self.entries.items()}
+
+        owner = owned.get(os.path.relpath(output_file, self.folder))
+        if owner not in (None, video_id) or (owner is None and output_file.exists()):
+            output_file = output_file.with_name(f"{output_file.stem} [{video_id}]{output_file.suffix}")
+        return output_file
+
+    def add(self, video_id: str, itags: list, output_file: str | Path) -> None:
+        entry = {"itags": itags, "output": os.path.relpath(output_file, self.folder),
+                 "size": os.path.getsize(output_file), "sha256": file_hash(output_file), "synced_at": time.time()}
+        with self.lock:
+            self.entries[video_id] = entry
+            self.save()
+
+    def save(self) -> None:
+        # Saved after every video, an interrupted sync keeps what it already finished
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({"videos": self.entries}, file, indent=4)
+        os.replace(temp_path, self.path)
+
+
+def sync_playlist(downloader, url: str, kind: str, workers: int, transcoders: int = None,
+                  progress_callback: any = None, pending_callback: any = None, done_callback: any = None,
+                  error_callback: any = None, verify: bool = False) -> tuple:
+    """ Downloads the videos of a playlist that aren't in its manifest yet, returns (skipped, failed) """
+    playlist = downloader.fetch_playlist(url, refresh=True)
+    manifest = PlaylistManifest(downloader.output_dir, extract.playlist_id(url), kind)
+
+    video_urls = playlist["video_urls"]
+    pending = [(index, video_url) for index, video_url in enumerate(video_urls)
+               if not manifest.is_current(extract.video_id(video_url), verify)]
+    if pending_callback:
+        pending_callback(len(pending), len(video_urls))
+
+    def fetch(item: tuple):
+        _, video_url = item
+        return downloader.fetch(video_url, kind, progress_callback(item) if progress_callback else None, None)
+
+    def finalize(job) -> None:
+        job.output_file = manifest.claim(job.video_id, job.output_file)
+        downloader.finalize(job)
+        manifest.add(job.video_id, job.itags, job.output_file)
+
+    failed = 0
+    if pending:
+        failed = Pipeline(workers, transcoders).run(pending, fetch, downloader.transcode, finalize, done_callback,
+                                                    error_callback)
+    return len(video_urls) - len(pending), failed
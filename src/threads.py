@@ -1,11 +1,37 @@
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import TYPE_CHECKING
 
 from PyQt5.QtCore import QThread, pyqtSignal
 
 from src.config import cfg
 from src.functions import format_time
-from src.pytube_function import PytubeFunction
-from src.updater import update_app
+from src.pipeline import Pipeline
+from src.profiling import profiled
+from src.thumbnail_cache import ROW_HEIGHT, scaled_thumbnail
+from src.progress import ProgressTracker, stream_parts
+
+if TYPE_CHECKING:
+    from src.pytube_function import MediaJob, PytubeFunction
+
+
+def create_pytube_function(audio_format: str = None) -> "PytubeFunction":
+    # pytube, requests and sqlite are only imported once the first job starts, not at app startup
+    from src.http_session import configure_session
+    from src.metadata_cache import MetadataCache
+    from src.metrics import configure_metrics
+    from src.pytube_function import PytubeFunction
+    from src.rate_limiter import MBIT, set_global_rate, set_job_rate
+
+    configure_session(cfg.get(cfg.poolSize), cfg.get(cfg.timeout))
+    configure_metrics(cfg.get(cfg.metricsFolder) if cfg.get(cfg.metricsEnabled) else None)
+    set_global_rate(cfg.get(cfg.maxBandwidth) * MBIT)
+    set_job_rate(cfg.get(cfg.jobBandwidth) * MBIT)
+    metadata_cache = MetadataCache(ttl=cfg.get(cfg.metadataTTL) * 3600, views_ttl=cfg.get(cfg.viewsTTL) * 60)
+    return PytubeFunction(cfg.get(cfg.downloadFolder), cfg.get(cfg.thumbnailCacheSize) * 1024 * 1024,
+                          metadata_cache, cfg.get(cfg.segments), cfg.get(cfg.streamingEnabled),
+                          cfg.get(cfg.scratchFolder), audio_format or cfg.get(cfg.audioFormat))
 
 
 class DownloadThread(QThread):
@@ -14,48 +40,158 @@ class DownloadThread(QThread):
     all_done_signal = pyqtSignal(bool)
     # Playlist
     complete_signal = pyqtSignal(int)
+    item_progress_signal = pyqtSignal(int, int)  # index, percentage, -1 once the item failed
 
-    def __init__(self, url: str | list, download_as: str = "video"):
+    def __init__(self, url: str | list, download_as: str = "video", audio_format: str = None):
         super().__init__()
         self.url = url
         self.download_as = download_as.lower().strip()
+        self.audio_format = audio_format
+        self.downloader = None
+        self.cancelled = False
+        # Sync jobs only know how many videos are new once the playlist is fetched
+        self.item_count = len(url) if isinstance(url, list) else 1
 
-        self.start_time = time.time()
+        self.tracker = ProgressTracker()
         self.total_complete = 0
+        self.total_failed = 0
+        self.item_progress = {}
+        self.item_trackers = {}
+        self.lock = threading.Lock()
 
+    @profiled
     def run(self):
-        downloader = PytubeFunction(cfg.get(cfg.downloadFolder))
-        if self.download_as == "audio":
-            downloader.download_audio(self.url, self.on_progress_callback, self.on_complete_callback,
-                                      self.all_done_callback)
-        elif self.download_as == "video":
-            downloader.download_video(self.url, self.on_progress_callback, self.on_complete_callback,
-                                      self.all_done_callback)
-        elif self.download_as == "playlist":
-            for url in self.url:
-                downloader.download_video(url, self.on_progress_callback, self.on_complete_callback,
+        try:
+            downloader = create_pytube_function(self.audio_format)
+            self.downloader = downloader
+            if self.cancelled:
+                downloader.cancel()
+            if self.download_as == "audio":
+                downloader.download_audio(self.url, self.on_progress_callback, self.on_complete_callback,
                                           self.all_done_callback)
-            self.all_done_signal.emit(True)
+            elif self.download_as == "video":
+                downloader.download_video(self.url, self.on_progress_callback, self.on_complete_callback,
+                                          self.all_done_callback)
+            elif self.download_as == "playlist":
+                self.download_playlist(downloader)
+            elif self.download_as == "sync":
+                self.sync_playlist(downloader)
+        except Exception as e:
+            # An exception escaping run() would abort the whole app, the queue marks the job as failed instead
+            print(f"An error occurred: {e}")
+            self.all_done_signal.emit(False)
+
+    def cancel(self) -> None:
+        """ Stops the job as soon as possible, it reports itself as failed """
+        self.cancelled = True
+        if self.downloader:
+            self.downloader.cancel()
+
+    def download_playlist(self, downloader: "PytubeFunction") -> None:
+        if downloader.streaming:
+            # ffmpeg already runs while downloading, there are no stages to overlap
+            max_workers = max(1, min(cfg.get(cfg.maxWorkers), len(self.url)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self.download_playlist_item, downloader, index, url): index
+                           for index, url in enumerate(self.url)}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        self.on_item_error_callback(futures[future], e)
+        else:
+            # Downloads go on while ffmpeg muxes the videos that are already there
+            pipeline = Pipeline(cfg.get(cfg.maxWorkers))
+            pipeline.run(list(enumerate(self.url)), partial(self.fetch_playlist_item, downloader),
+                         downloader.transcode, downloader.finalize,
+                         lambda item: self.on_item_done_callback(item[0]),
+                         lambda item, e: self.on_item_error_callback(item[0], e))
+
+        self.all_done_signal.emit(self.total_failed == 0)
+
+    def sync_playlist(self, downloader: "PytubeFunction") -> None:
+        from src.sync import sync_playlist
+
+        _, failed = sync_playlist(downloader, self.url, "video", cfg.get(cfg.maxWorkers),
+                                  progress_callback=lambda item: partial(self.on_item_progress_callback, item[0]),
+                                  pending_callback=self.on_pending_callback,
+                                  done_callback=lambda item: self.on_item_done_callback(item[0]),
+                                  error_callback=lambda item, e: self.on_item_error_callback(item[0], e))
+        self.all_done_signal.emit(failed == 0)
+
+    def on_pending_callback(self, pending: int, total: int) -> None:
+        self.item_count = max(1, pending)
+        if pending == 0:
+            self.progress_signal.emit(100)
+            self.timeleft_signal.emit(f"All {total} videos are up to date")
+        else:
+            self.timeleft_signal.emit(f"{total - pending} of {total} videos up to date, downloading {pending}")
+
+    def download_playlist_item(self, downloader: "PytubeFunction", index: int, url: str) -> None:
+        # Each item gets its own progress slot, so concurrent downloads don't overwrite each other.
+        # No complete callback: the job tracker only follows single downloads, its merge stage isn't theirs
+        downloader.download_video(url, partial(self.on_item_progress_callback, index), None,
+                                  partial(self.on_item_done_callback, index))
+
+    def fetch_playlist_item(self, downloader: "PytubeFunction", item: tuple) -> "MediaJob":
+        index, url = item
+        return downloader.fetch(url, "video", partial(self.on_item_progress_callback, index), None)
 
     def on_progress_callback(self, stream, _, bytes_remaining) -> None:
-        total_size = stream.filesize
-        bytes_downloaded = total_size - bytes_remaining
-        percentage_of_completion = int(bytes_downloaded / total_size * 100)
+        for key, filesize, remaining in stream_parts(stream, bytes_remaining):
+            self.tracker.update(key, filesize, remaining)
 
-        elapsed_time = time.time() - self.start_time
-        download_speed = bytes_downloaded / elapsed_time
-        estimated_time_left = int(bytes_remaining / download_speed)
+        # Chunks arrive from several threads many times a second, the UI only needs a few updates
+        if not self.tracker.due(force=bytes_remaining == 0):
+            return
 
-        self.progress_signal.emit(percentage_of_completion)
-        self.timeleft_signal.emit(f'Estimated time left: {format_time(estimated_time_left)}')
+        estimated_time_left = self.tracker.eta()
+        self.progress_signal.emit(self.tracker.percentage())
+        if estimated_time_left is None:
+            self.timeleft_signal.emit('Estimating time left...')
+        else:
+            self.timeleft_signal.emit(f'Estimated time left: {format_time(estimated_time_left)}')
 
     def on_complete_callback(self, _, file_path) -> None:
-        self.timeleft_signal.emit('Processing and merging downloaded files...')
+        # Called once per stream, merging starts after the last one
+        if self.tracker.done():
+            self.tracker.start_stage("merge")
+            self.timeleft_signal.emit('Processing and merging downloaded files...')
+
+    def on_item_progress_callback(self, index: int, stream, _, bytes_remaining) -> None:
+        with self.lock:
+            tracker = self.item_trackers.setdefault(index, ProgressTracker())
+        for key, filesize, remaining in stream_parts(stream, bytes_remaining):
+            tracker.update(key, filesize, remaining)
+
+        if tracker.due(force=bytes_remaining == 0):
+            self.update_item_progress(index, tracker.percentage())
+
+    def on_item_done_callback(self, index: int) -> None:
+        self.update_item_progress(index, 100)
+        self.all_done_callback()
+
+    def on_item_error_callback(self, index: int, error: Exception) -> None:
+        print(f"An error occurred: {error}")
+        with self.lock:
+            self.total_failed += 1
+        self.item_progress_signal.emit(index, -1)
+
+    def update_item_progress(self, index: int, percentage: int) -> None:
+        with self.lock:
+            self.item_progress[index] = percentage
+            overall = int(sum(self.item_progress.values()) / self.item_count)
+
+        self.item_progress_signal.emit(index, percentage)
+        if self.tracker.due("overall", force=percentage == 100):
+            self.progress_signal.emit(overall)
 
     def all_done_callback(self, ) -> None:
-        if self.download_as == "playlist":
-            self.total_complete += 1
-            self.complete_signal.emit(self.total_complete)
+        if self.download_as in ("playlist", "sync"):
+            with self.lock:
+                self.total_complete += 1
+                total_complete = self.total_complete
+            self.complete_signal.emit(total_complete)
         else:
             self.all_done_signal.emit(True)
 
@@ -63,23 +199,39 @@ class DownloadThread(QThread):
 class QuickSearchThread(QThread):
     signal = pyqtSignal(dict)
     error_signal = pyqtSignal(str)
+    # Playlist
+    header_signal = pyqtSignal(dict)
+    video_signal = pyqtSignal(int, dict)
 
     def __init__(self, url: str, search: str = "video"):
         super().__init__()
         self.url = url
         self.search = search.lower().strip()
 
+    @profiled
     def run(self):
-        pytube_function = PytubeFunction(cfg.get(cfg.downloadFolder))
+        pytube_function = create_pytube_function()
         if self.search == "video":
             get_detail = pytube_function.quick_search(self.url)
         else:
-            get_detail = pytube_function.search_playlist(self.url)
+            # Stream the playlist header first, then every video as soon as it is resolved
+            get_detail = pytube_function.search_playlist(self.url, cfg.get(cfg.searchWorkers),
+                                                         self.header_signal.emit, self.on_video_callback)
 
-        if "error" in get_detail:
+        if get_detail is None:
+            self.error_signal.emit("Nothing found for this URL")
+        elif "error" in get_detail:
             self.error_signal.emit(get_detail["error"])
-        else:
+        elif self.search == "video":
             self.signal.emit(get_detail)
+            # While the preview is looked at, a click on Download would otherwise wait for this
+            pytube_function.prefetch_streams(self.url)
+
+    def on_video_callback(self, index: int, video_detail: dict) -> None:
+        if video_detail and "error" not in video_detail:
+            # Decode the row sized thumbnail here, not on the GUI thread
+            scaled_thumbnail(video_detail["thumbnail_path"], ROW_HEIGHT)
+            self.video_signal.emit(index, video_detail)
 
 
 class UpdateThread(QThread):
@@ -88,6 +240,11 @@ class UpdateThread(QThread):
     def __init__(self):
         super().__init__()
 
+    @profiled
     def run(self):
+        from src.http_session import configure_session
+        from src.updater import update_app
+
+        configure_session(cfg.get(cfg.poolSize), cfg.get(cfg.timeout))
         msg = update_app()
         self.signal.emit(msg)
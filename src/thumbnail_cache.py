@@ -0,0 +1,113 @@
+import hashlib
+import math
+import os
+import threading
+import uuid
+from pathlib import Path
+from urllib.parse import urlparse
+
+CACHE_PATH = Path(__file__).parent / "assets" / "cache" / "thumbnails"
+ROW_HEIGHT = 100  # height of the thumbnails in playlist rows
+
+_lock = threading.Lock()
+
+
+def thumbnail_variant(thumbnail_url: str) -> str:
+    # e.g. https://i.ytimg.com/vi/<id>/sddefault.jpg?v=... -> sddefault.jpg
+    return os.path.basename(urlparse(thumbnail_url).path) or "default.jpg"
+
+
+class ThumbnailCache:
+    """ Persistent thumbnail store keyed by video id and variant, evicted least recently used first """
+
+    def __init__(self, cache_dir: str | Path = CACHE_PATH, max_size: int = 200 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, video_id: str, variant: str) -> Path:
+        key = hashlib.sha1(f"{video_id}/{variant}".encode()).hexdigest()
+        return self.cache_dir / f"{key}{Path(variant).suffix or '.jpg'}"
+
+    def get(self, video_id: str, variant: str) -> str | None:
+        path = self.path(video_id, variant)
+        try:
+            # Bump the mtime so eviction sees the entry as recently used
+            os.utime(path)
+        except OSError:
+            return None
+        return str(path)
+
+    def put(self, video_id: str, variant: str, data: bytes) -> str:
+        return self.put_stream(video_id, variant, [data])
+
+    def put_stream(self, video_id: str, variant: str, chunks: any) -> str:
+        """ Writes the chunks straight to disk, the whole image is never held in memory """
+        path = self.path(video_id, variant)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp_path, 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        except Exception:
+            if temp_path.exists():
+                os.remove(temp_path)
+            raise
+        os.replace(temp_path, path)
+
+        self.evict()
+        return str(path)
+
+    def evict(self) -> None:
+        with _lock:
+            entries = []
+            total_size = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                    total_size -= size
+                except OSError:
+                    pass
+
+
+def scaled_thumbnail(path: str | None, height: int) -> str | None:
+    """ Copy of a cached thumbnail decoded straight to the given height, stored next to it """
+    # Only the GUI decodes images, the CLI never gets here
+    from PyQt5.QtCore import QSize
+    from PyQt5.QtGui import QGuiApplication, QImageReader
+
+    if not path:
+        return path
+
+    app = QGuiApplication.instance()
+    pixels = math.ceil(height * getattr(app, "devicePixelRatio", lambda: 1)())
+    source = Path(path)
+    scaled_path = source.with_name(f"{source.stem}-{pixels}.jpg")
+    try:
+        os.utime(scaled_path)
+        return str(scaled_path)
+    except OSError:
+        pass
+
+    reader = QImageReader(str(source))
+    size = reader.size()
+    if not size.isValid() or size.height() <= pixels:
+        return path
+
+    # The JPEG decoder skips the detail it doesn't need, the full size bitmap is never built
+    reader.setScaledSize(QSize(round(size.width() * pixels / size.height()), pixels))
+    image = reader.read()
+    temp_path = scaled_path.with_name(f"{scaled_path.name}.{uuid.uuid4().hex}.tmp")
+    if image.isNull() or not image.save(str(temp_path), "JPG", 90):
+        return path
+    os.replace(temp_path, scaled_path)
+    return str(scaled_path)
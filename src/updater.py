@@ -5,7 +5,8 @@ import sys
 from pathlib import Path
 
 import pytube
-import requests
+
+from src.http_session import get_session
 
 DOWNLOAD_PATH = Path(__file__).parent / "assets" / "downloads"
 
@@ -32,7 +33,7 @@ def get_current_version() -> str:
 
 def get_latest_version_from_github() -> str:
     url = "https://raw.githubusercontent.com/pytube/pytube/master/pytube/version.py"
-    response = requests.get(url)
+    response = get_session().get(url)
 
     # The content of the file is included in the response text
     file_content = response.text
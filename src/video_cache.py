@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
+
+from pytube import extract
+
+MAX_ENTRIES = 64
+# Used when the stream URLs don't say when they expire, and for objects whose streams aren't resolved yet
+DEFAULT_TTL = 30 * 60
+# A download has to start well before its URLs expire, segments are requested until the end
+EXPIRY_MARGIN = 10 * 60
+
+_video_cache = None
+_lock = threading.Lock()
+
+
+def stream_expiry(yt_obj) -> float:
+    expires = [int(value[0]) for stream in yt_obj.streams
+               if (value := parse_qs(urlparse(stream.url).query).get("expire"))]
+    return min(expires) - EXPIRY_MARGIN if expires else time.time() + DEFAULT_TTL
+
+
+class VideoCache:
+    """ Resolved YouTube objects by video id, with their deciphered stream URLs, shared by preview and download """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Striped, so a download waits for the preview still resolving the same video instead of doing it again
+        self.video_locks = [threading.Lock() for _ in range(16)]
+
+    def video(self, url: str, factory: any, streams: bool = False) -> tuple:
+        """ (YouTube object, cached) for a URL, built with factory on a miss, with streams also resolved """
+        video_id = extract.video_id(url)
+        with self.video_locks[hash(video_id) % len(self.video_locks)]:
+            with self.lock:
+                entry = self.entries.get(video_id)
+                if entry and entry["expires"] <= time.time():
+                    del self.entries[video_id]
+                    entry = None
+                if entry and (entry["streams"] or not streams):
+                    self.entries.move_to_end(video_id)
+                    return entry["video"], True
+
+            yt_obj = entry["video"] if entry else factory(url)
+            expires = stream_expiry(yt_obj) if streams else time.time() + DEFAULT_TTL
+            if entry:
+                # The player response of the cached object is reused, only the stream manifest is new
+                expires = min(expires, entry["expires"])
+
+            with self.lock:
+                self.entries[video_id] = {"video": yt_obj, "streams": streams, "expires": expires}
+                self.entries.move_to_end(video_id)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return yt_obj, False
+
+    def discard(self, video_id: str) -> None:
+        """ Drops a video whose URLs stopped working, the next download resolves it again """
+        with self.lock:
+            self.entries.pop(video_id, None)
+
+
+def get_video_cache() -> VideoCache:
+    global _video_cache
+
+    with _lock:
+        if _video_cache is None:
+            _video_cache = VideoCache()
+        return _video_cache
@@ -1,12 +1,39 @@
+import os
+from functools import lru_cache
+
 from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
 from PyQt5.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QLayout
 from qfluentwidgets import ImageLabel, TitleLabel, StrongBodyLabel, CaptionLabel, PushButton, FluentIcon, \
     SingleDirectionScrollArea, BodyLabel, IconWidget, \
-    CardWidget, SearchLineEdit, InfoBar, InfoBarPosition
+    CardWidget, SearchLineEdit, InfoBar, InfoBarPosition, ProgressBar, ComboBox, TransparentToolButton
 
-from src.dialog import PlayListDownloadDialog
+from src.download_queue import download_queue, DownloadJob, PRIORITIES
 from src.functions import validate_url
 from src.threads import QuickSearchThread
+from src.thumbnail_cache import ROW_HEIGHT, scaled_thumbnail
+
+
+def show_queued_info(parent, title: str) -> None:
+    InfoBar.success("Added to queue", title, duration=3000, parent=parent, position=InfoBarPosition.BOTTOM_RIGHT)
+
+
+def load_image(path: str, height: int = None) -> QImage:
+    if height:
+        # Lists only hold a small copy, decoded at the size it is shown
+        path = scaled_thumbnail(path, height)
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return QImage(path)
+    # Thumbnails are named by video id and variant, one evicted and downloaded again is a new file at the
+    # same path. Not keyed by mtime, the thumbnail cache bumps it on every lookup
+    return decode_image(path, stat.st_ino, stat.st_size)
+
+
+@lru_cache(maxsize=256)
+def decode_image(path: str, inode: int, size: int) -> QImage:
+    return QImage(path)
 
 
 class PlayListCardWidget(QWidget):
@@ -16,19 +43,23 @@ class PlayListCardWidget(QWidget):
 
         self.parent = parent
 
+        self.p_url = playlist_info["url"]
         self.p_title = playlist_info["title"]
         self.p_videos = playlist_info["videos"]
         self.p_views = playlist_info["views"]
         self.p_last_updated = playlist_info["last_updated"]
         self.p_owner = playlist_info["owner"]
 
-        self.p_video_info = playlist_info["video_info"]
         self.p_video_urls = playlist_info["video_urls"]
-
-        self.first_image = self.p_video_info[0]["thumbnail_path"]
+        # Videos arrive one by one, keyed by their position in the playlist
+        self.p_video_info = {}
 
         self.init_ui()
 
+        for index, video in enumerate(playlist_info.get("video_info", [])):
+            if video and "error" not in video:
+                self.add_video(index, video)
+
     def init_ui(self):
         self._init_main_layout()
         self._init_left_layout()
@@ -52,13 +83,17 @@ class PlayListCardWidget(QWidget):
         self._add_playlist_image()
         self._add_labels()
         self._add_download_all_button()
+        self._add_sync_button()
 
     def _add_playlist_image(self):
-        self.playlist_image = ImageLabel(image=self.first_image)
-        self.playlist_image.scaledToHeight(200)
+        self.playlist_image = ImageLabel()
         self.playlist_image.setBorderRadius(5, 5, 5, 5)
         self.left_layout.addWidget(self.playlist_image)
 
+    def _set_playlist_image(self, image: str) -> None:
+        self.playlist_image.setImage(load_image(image, 200))
+        self.playlist_image.scaledToHeight(200)
+
     def _add_labels(self):
         self.label_1 = TitleLabel(text=self.p_title)
         self.left_layout.addWidget(self.label_1)
@@ -71,9 +106,16 @@ class PlayListCardWidget(QWidget):
 
     def _add_download_all_button(self):
         self.download_all_btn = PushButton(text="Download all", icon=FluentIcon.DOWNLOAD)
+        self.download_all_btn.setDisabled(True)
         self.download_all_btn.clicked.connect(self.download_all_callback)
         self.left_layout.addWidget(self.download_all_btn)
 
+    def _add_sync_button(self):
+        # Only downloads videos that aren't in the download folder yet, no need to wait for the preview
+        self.sync_btn = PushButton(text="Sync new videos", icon=FluentIcon.SYNC)
+        self.sync_btn.clicked.connect(self.sync_callback)
+        self.left_layout.addWidget(self.sync_btn)
+
     def _init_scroll_area(self):
         self.scrollArea = SingleDirectionScrollArea(orient=Qt.Vertical)
 
@@ -81,25 +123,36 @@ class PlayListCardWidget(QWidget):
         self.layout = QVBoxLayout(self.view)
         self.layout.setContentsMargins(10, 10, 10, 10)
 
-        self.add_video_widgets()
-
         self.scrollArea.setWidget(self.view)
+        self.scrollArea.setWidgetResizable(True)
         self.scrollArea.setStyleSheet("QScrollArea{background: transparent; border: none}")
         self.view.setStyleSheet("QWidget{background: transparent}")
 
         self.main_layout.addWidget(self.scrollArea)
 
-    def add_video_widgets(self):
-        for video in self.p_video_info:
-            self._add_video_widget(video['thumbnail_path'], video['title'], video['views'], video['publish_date'])
+    def add_video(self, index: int, video: dict) -> None:
+        if index in self.p_video_info:
+            return
+
+        # Keep rows in playlist order even though videos resolve out of order
+        position = sum(1 for resolved in self.p_video_info if resolved < index)
+        self.p_video_info[index] = video
+
+        if index == min(self.p_video_info):
+            self._set_playlist_image(video['thumbnail_path'])
 
-    def _add_video_widget(self, thumbnail_path: str, title: str, views: str, publish_date: str) -> None:
+        self._add_video_widget(position, video['thumbnail_path'], video['title'], video['views'],
+                               video['publish_date'])
+        self.download_all_btn.setDisabled(False)
+
+    def _add_video_widget(self, position: int, thumbnail_path: str, title: str, views: str,
+                          publish_date: str) -> None:
         self.right_layout = QHBoxLayout()
         self.right_layout.setContentsMargins(0, 0, 0, 0)
         self.right_layout.setAlignment(Qt.AlignTop)
 
-        self.video_image = ImageLabel(image=thumbnail_path)
-        self.video_image.scaledToHeight(100)
+        self.video_image = ImageLabel(image=load_image(thumbnail_path, ROW_HEIGHT))
+        self.video_image.scaledToHeight(ROW_HEIGHT)
         self.video_image.setBorderRadius(5, 5, 5, 5)
         self.right_layout.addWidget(self.video_image)
 
@@ -115,11 +168,104 @@ class PlayListCardWidget(QWidget):
 
         self.right_layout.addLayout(self.vertical_layout)
 
-        self.layout.addLayout(self.right_layout)
+        self.layout.insertLayout(position, self.right_layout)
 
     def download_all_callback(self):
-        dialog = PlayListDownloadDialog(self.parent, self.p_video_urls)
-        dialog.exec()
+        # Only videos resolved so far, the rest are still being looked up
+        urls = [self.p_video_urls[index] for index in sorted(self.p_video_info)]
+        download_queue().add(urls, "playlist", self.p_title)
+        show_queued_info(self.parent, self.p_title)
+
+    def sync_callback(self):
+        download_queue().add(self.p_url, "sync", self.p_title)
+        show_queued_info(self.parent, self.p_title)
+
+
+class LazyInterface(QWidget):
+    """ Navigation placeholder, the real interface is only built the first time it is shown """
+
+    def __init__(self, parent, object_name: str, factory):
+        super().__init__(parent=parent)
+        self.setObjectName(object_name)
+
+        self.factory = factory
+        self.interface = None
+
+        self.main_layout = QVBoxLayout(self)
+        self.main_layout.setContentsMargins(0, 0, 0, 0)
+
+    def showEvent(self, event):
+        if self.interface is None:
+            self.interface = self.factory()
+            self.main_layout.addWidget(self.interface)
+        super().showEvent(event)
+
+
+class QueueItemWidget(CardWidget):
+    STATUS_TEXT = {"pending": "Waiting", "running": "Downloading", "done": "Completed", "failed": "Failed"}
+
+    def __init__(self, parent, job: DownloadJob):
+        super().__init__(parent=parent)
+        self.job_id = job.id
+
+        self.title_label = StrongBodyLabel(job.title, self)
+        self.status_label = CaptionLabel(self)
+        self.items_label = CaptionLabel(self)
+        self.progress = ProgressBar(self)
+        self.progress.setRange(0, 100)
+
+        self.priority_box = ComboBox(self)
+        self.priority_box.addItems(list(PRIORITIES))
+        self.priority_box.setCurrentIndex(list(PRIORITIES.values()).index(job.priority))
+        self.priority_box.currentIndexChanged.connect(self.priority_callback)
+
+        self.up_btn = TransparentToolButton(FluentIcon.UP, self)
+        self.up_btn.clicked.connect(lambda: download_queue().move(self.job_id, -1))
+        self.down_btn = TransparentToolButton(FluentIcon.DOWN, self)
+        self.down_btn.clicked.connect(lambda: download_queue().move(self.job_id, 1))
+        self.retry_btn = TransparentToolButton(FluentIcon.SYNC, self)
+        self.retry_btn.clicked.connect(lambda: download_queue().retry(self.job_id))
+        self.remove_btn = TransparentToolButton(FluentIcon.DELETE, self)
+        self.remove_btn.clicked.connect(lambda: download_queue().remove(self.job_id))
+
+        self.v_box_layout = QVBoxLayout()
+        self.v_box_layout.setContentsMargins(0, 0, 0, 0)
+        self.v_box_layout.addWidget(self.title_label)
+        self.v_box_layout.addWidget(self.status_label)
+        self.v_box_layout.addWidget(self.items_label)
+        self.v_box_layout.addWidget(self.progress)
+
+        self.h_box_layout = QHBoxLayout(self)
+        self.h_box_layout.setContentsMargins(20, 11, 11, 11)
+        self.h_box_layout.setSpacing(10)
+        self.h_box_layout.addLayout(self.v_box_layout, 1)
+        self.h_box_layout.addWidget(self.priority_box)
+        self.h_box_layout.addWidget(self.up_btn)
+        self.h_box_layout.addWidget(self.down_btn)
+        self.h_box_layout.addWidget(self.retry_btn)
+        self.h_box_layout.addWidget(self.remove_btn)
+
+        self.update_job(job)
+
+    def update_job(self, job: DownloadJob) -> None:
+        status = f"{job.kind.capitalize()} - {self.STATUS_TEXT[job.status]}"
+        if job.detail:
+            status += f" - {job.detail}"
+        self.status_label.setText(status)
+        self.progress.setValue(job.progress)
+
+        # Videos of a playlist download in parallel, each one with its own progress
+        self.items_label.setText("  ".join(f"#{index + 1}: {value}%" for index, value in sorted(job.items.items())))
+        self.items_label.setVisible(bool(job.items))
+
+        self.retry_btn.setVisible(job.status == "failed")
+        self.remove_btn.setEnabled(job.status != "running")
+        self.priority_box.setEnabled(job.status == "pending")
+        self.up_btn.setEnabled(job.status == "pending")
+        self.down_btn.setEnabled(job.status == "pending")
+
+    def priority_callback(self, index: int) -> None:
+        download_queue().set_priority(self.job_id, list(PRIORITIES.values())[index])
 
 
 class GuideWidget(CardWidget):
@@ -148,13 +294,17 @@ class GuideWidget(CardWidget):
 
 
 class SearchWidget(QWidget):
-    def __init__(self, parent, preview_layout: QLayout, preview_ui, search: str = "video"):
+    def __init__(self, parent, preview_layout: QLayout, preview_ui, search: str = "video", preview_item_ui=None):
         super().__init__(parent=parent)
         self.parent = parent
         self.preview_layout = preview_layout
         self.preview_ui = preview_ui
+        self.preview_item_ui = preview_item_ui
         self.url = None
         self.search = search.lower().strip()
+        self.start_quick_search = None
+        # Searches dropped by Refresh can still be running, a QThread must outlive its run()
+        self.search_threads = []
 
         self.setObjectName("search_widget")
         self._init_layout()
@@ -185,7 +335,12 @@ class SearchWidget(QWidget):
             self.url = url
 
             self.start_quick_search = QuickSearchThread(url, self.search)
+            self.search_threads.append(self.start_quick_search)
+            self.start_quick_search.finished.connect(self.prune_search_threads)
             self.start_quick_search.signal.connect(self.preview_ui)
+            self.start_quick_search.header_signal.connect(self.preview_ui)
+            if self.preview_item_ui:
+                self.start_quick_search.video_signal.connect(self.preview_item_ui)
             self.start_quick_search.error_signal.connect(self.show_error)
             self.start_quick_search.start()
         else:
@@ -213,9 +368,22 @@ class SearchWidget(QWidget):
         )
 
     def refresh_callback(self) -> None:
+        # Drop results that are still streaming in from the previous search
+        if self.start_quick_search:
+            for signal in (self.start_quick_search.signal, self.start_quick_search.header_signal,
+                           self.start_quick_search.video_signal, self.start_quick_search.error_signal):
+                try:
+                    signal.disconnect()
+                except TypeError:
+                    pass  # nothing connected
+            self.start_quick_search = None
+
         self.reset_search_input()
         self.clear_layout(self.preview_layout)
 
+    def prune_search_threads(self) -> None:
+        self.search_threads = [thread for thread in self.search_threads if not thread.isFinished()]
+
     def clear_layout(self, layout: QLayout) -> None:
         while layout.count():
             child = layout.takeAt(0)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+SCRATCH_PATH = Path(__file__).parent / "assets" / "downloads"
+# Job folders get a subfolder of their own, the scratch root may be a shared folder like /dev/shm
+WORKSPACE_DIR = "ultrafetch"
+MARKER_NAME = ".ultrafetch-job"
+
+_active = set()
+_active_lock = threading.Lock()
+
+
+def workspace_root(root: str | Path) -> Path:
+    return Path(root) / WORKSPACE_DIR
+
+
+def has_downloads(path: str | Path) -> bool:
+    """ Partial or finished streams, named <itag>.<subtype> by the job, either one is worth resuming from """
+    return any(name.endswith('.part') or name.split('.', 1)[0].isdigit() for name in os.listdir(path))
+
+
+def is_workspace(path: str | Path) -> bool:
+    return os.path.isfile(os.path.join(path, MARKER_NAME))
+
+
+def move_atomic(source: str | Path, destination: str | Path) -> str:
+    """ Moves a file so it appears complete at its destination, also across file systems """
+    destination = Path(destination)
+    try:
+        os.replace(source, destination)
+    except OSError:
+        # Different file system (e.g. a tmpfs scratch root): copy next to the destination, then rename
+        temp_path = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, destination)
+        except OSError:
+            if temp_path.exists():
+                os.remove(temp_path)
+            raise
+        os.remove(source)
+    return str(destination)
+
+
+class JobWorkspace:
+    """ Scratch folder of a single download job, removed once the job is done """
+
+    def __init__(self, root: str | Path, name: str):
+        # Same name for the same job, so an interrupted download finds its .part files again
+        self.path = workspace_root(root) / name
+
+    def __enter__(self) -> "JobWorkspace":
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, tb) -> None:
+        from src.downloader import DownloadCancelled  # requests is only imported once a job starts
+
+        self.close(failed=exc_type is not None,
+                   cancelled=exc_type is not None and issubclass(exc_type, DownloadCancelled))
+
+    def open(self) -> "JobWorkspace":
+        # A second job for the same output would write into this folder and remove it under the first one
+        with _active_lock:
+            if self.path in _active:
+                raise RuntimeError(f"{self.path.name} is already being downloaded")
+            _active.add(self.path)
+
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            # Cleanup only ever removes folders carrying this marker
+            Path(self.path, MARKER_NAME).touch()
+        except OSError:
+            with _active_lock:
+                _active.discard(self.path)
+            raise
+        return self
+
+    def close(self, failed: bool = False, cancelled: bool = False) -> None:
+        # A stopped or failed job comes back as pending, whatever it downloaded stays for that run
+        if not failed or not (cancelled or has_downloads(self.path)):
+            shutil.rmtree(self.path, ignore_errors=True)
+        with _active_lock:
+            _active.discard(self.path)
+
+    def file(self, name: str) -> str:
+        return str(self.path / name)
+
+    def finalize(self, temp_output: str, output_file: str | Path) -> str:
+        Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+        return move_atomic(temp_output, output_file)